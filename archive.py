@@ -0,0 +1,171 @@
+import hashlib
+import os
+import shutil
+import sqlite3
+import threading
+import time
+
+from paths import cache_dir, data_dir
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    extractor  TEXT NOT NULL,
+    video_id   TEXT NOT NULL,
+    format_id  TEXT NOT NULL,
+    kind       TEXT NOT NULL,       -- 'file': a finished download, 'stream': one cached input of a merge
+    path       TEXT NOT NULL,
+    size       INTEGER NOT NULL,
+    sha1       TEXT,
+    created    REAL NOT NULL,
+    PRIMARY KEY (extractor, video_id, format_id, kind, path)
+);
+CREATE INDEX IF NOT EXISTS files_sha1 ON files (sha1);
+"""
+
+
+def hardlink(src, dst):
+    """Hardlinks `src` to `dst`, replacing it; returns False (and leaves `dst` alone) if linking fails."""
+    tmp = f"{dst}.{threading.get_ident()}.tmp"
+    try:
+        os.link(src, tmp)
+    except OSError:
+        return False
+    os.replace(tmp, dst)
+    return True
+
+
+def link_or_copy(src, dst):
+    """Hardlinks `src` to `dst`, copying instead across filesystems. Returns True for a link."""
+    if hardlink(src, dst): return True
+    tmp = f"{dst}.{threading.get_ident()}.tmp"
+    shutil.copyfile(src, tmp)
+    os.replace(tmp, dst)
+    return False
+
+
+def size_matches(size, fmt):
+    """False if `fmt` states a size that `size` contradicts: its exact filesize, or filesize_approx off by over 25%."""
+    if not fmt: return True
+    if fmt.get('filesize'): return size == fmt['filesize']
+    if fmt.get('filesize_approx'): return abs(size - fmt['filesize_approx']) <= fmt['filesize_approx'] / 4
+    return True
+
+
+def file_sha1(path):
+    sha = hashlib.sha1()
+    with open(path, 'rb') as f:
+        while chunk := f.read(1 << 20): sha.update(chunk)
+    return sha.hexdigest()
+
+
+class DownloadArchive:
+    """Index of downloaded media keyed by extractor, video id and format, in SQLite.
+
+    Finished files let a repeat download of the same video and format (under any URL that
+    extracts to it) be satisfied by the file already on disk or a hardlink to it. The separate
+    video and audio streams of merged downloads are hardlinked into a size-capped store, so a
+    later job needing the same stream (one `bestaudio` for several video qualities) skips
+    downloading it; streams that can't be linked there are not kept.
+    With `hash_files`, finished files are hashed and an identical file found under another key
+    is replaced by a hardlink. Entries whose file has gone are dropped on lookup.
+    Extractors in UNSTABLE_IDS take the id from the URL's file name ("video", "index"), so
+    unrelated links share it; their downloads are never reused.
+    """
+    UNSTABLE_IDS = frozenset({"Generic"})
+
+    def __init__(self, path=None, streams_dir=None, max_stream_bytes=2 * 2**30, hash_files=False):
+        self.path = path or os.path.join(data_dir(), "archive.sqlite3")
+        self.streams_dir = streams_dir or cache_dir("streams")
+        self.max_stream_bytes = max_stream_bytes
+        self.hash_files = hash_files
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+    @staticmethod
+    def key(info, format_id):
+        return (info.get('extractor_key') or info.get('extractor') or "", str(info.get('id') or ""), str(format_id))
+
+    def reusable(self, info):
+        return bool(info.get('id')) and self.key(info, None)[0] not in self.UNSTABLE_IDS
+
+    # --- LOOKUP ---
+    def find(self, info, format_id, kind="file", expect=None):
+        """Path of an archived `kind` entry that still exists with its recorded size, or None.
+
+        With `expect` (a format dict), entries whose size contradicts its filesize are passed over.
+        """
+        if not self.reusable(info): return None
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT path, size FROM files WHERE extractor = ? AND video_id = ? AND format_id = ? AND kind = ?"
+                " ORDER BY created DESC", (*self.key(info, format_id), kind)).fetchall()
+        for path, size in rows:
+            try:
+                if os.path.getsize(path) != size:
+                    self._forget(path)
+                elif size_matches(size, expect):
+                    return path
+            except OSError:
+                self._forget(path)
+        return None
+
+    def _forget(self, path):
+        with self._lock: self._conn.execute("DELETE FROM files WHERE path = ?", (path,))
+
+    def reuse_stream(self, info, format_id, dest):
+        """Links an archived stream into `dest`; returns False if there is none."""
+        stored = self.find(info, format_id, "stream", expect=info)
+        if stored is None: return False
+        link_or_copy(stored, dest)
+        with self._lock: self._conn.execute("UPDATE files SET created = ? WHERE path = ?", (time.time(), stored))
+        return True
+
+    # --- RECORDING ---
+    def add_file(self, info, format_id, path):
+        """Records a finished download; returns the path of an identical file it was linked to, if any."""
+        sha1 = file_sha1(path) if self.hash_files else None
+        size = os.path.getsize(path)
+        twin = None
+        if sha1:
+            with self._lock:
+                rows = self._conn.execute("SELECT path FROM files WHERE sha1 = ? AND size = ? AND path != ? AND kind = 'file'",
+                                          (sha1, size, path)).fetchall()
+            twin = next((p for (p,) in rows if os.path.isfile(p) and not os.path.samefile(p, path)), None)
+            # Same bytes under another video id or format: keep one copy on disk. Without a
+            # link there is nothing to gain from rewriting the file with identical bytes
+            if twin and not hardlink(twin, path): twin = None
+        self._put(info, format_id, "file", path, size, sha1)
+        return twin
+
+    def add_stream(self, info, fmt, path):
+        """Keeps a hardlink to one downloaded stream of a merge; never a copy of it."""
+        key = self.key(info, fmt.get('format_id'))
+        if not self.reusable(info) or not os.path.isfile(path) or self.find(info, key[2], "stream"): return
+        name = "-".join(part.replace(os.sep, "_") for part in key) + os.path.splitext(path)[1]
+        stored = os.path.join(self.streams_dir, name)
+        if not hardlink(path, stored): return
+        self._put(info, key[2], "stream", stored, os.path.getsize(stored), None)
+        self._evict_streams()
+
+    def _put(self, info, format_id, kind, path, size, sha1):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                               (*self.key(info, format_id), kind, path, size, sha1, time.time()))
+
+    def _evict_streams(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT path, size FROM files WHERE kind = 'stream' ORDER BY created DESC").fetchall()
+        total = 0
+        for path, size in rows:
+            total += size
+            if total <= self.max_stream_bytes: continue
+            try: os.remove(path)
+            except OSError: pass
+            self._forget(path)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
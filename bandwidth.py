@@ -0,0 +1,193 @@
+import re
+import threading
+import time
+
+MIN_RATE = 16 * 1024        # downloads never drop below this while a reservation is active
+LINK_SHARE = 0.8            # of the measured link capacity, the cap while favoring or reserving without one
+
+
+class TokenBucket:
+    """`rate` bytes per second with up to `burst` seconds saved up; may run into debt."""
+    def __init__(self, rate, burst=1.0):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = rate * burst
+        self._stamp = time.monotonic()
+
+    def refill(self, now):
+        self.tokens = min(self.rate * self.burst, self.tokens + (now - self._stamp) * self.rate)
+        self._stamp = now
+
+    def delay(self):
+        """Seconds until the bucket is out of debt."""
+        return 0.0 if self.tokens > 0 else -self.tokens / self.rate + 1e-3
+
+
+def parse_rate(text):
+    """'500k', '2M', '1.5MiB' -> bytes per second; '', '0', 'off' and 'none' -> None (no cap)."""
+    text = str(text).strip().lower()
+    if text in ("", "0", "off", "none"): return None
+    m = re.fullmatch(r"(\d+(?:\.\d+)?)\s*([kmg]?)(?:i?b)?(?:/s)?", text)
+    if not m: raise ValueError(f"invalid rate {text!r}")
+    return int(float(m.group(1)) * 1024 ** " kmg".index(m.group(2) or " "))
+
+
+def parse_schedule(text):
+    """'22:00-07:00=0, 09:00-18:00=2M' -> [(start minute, end minute, bytes/s or None), ...].
+
+    A window that ends before it starts runs over midnight; a rate of 0 lifts the cap.
+    """
+    schedule = []
+    for item in filter(None, (part.strip() for part in text.split(","))):
+        window, _, rate = item.partition("=")
+        m = re.fullmatch(r"(\d{1,2}):(\d\d)-(\d{1,2}):(\d\d)", window.strip())
+        if not m: raise ValueError(f"invalid time window {window!r}")
+        h1, m1, h2, m2 = map(int, m.groups())
+        schedule.append((h1 * 60 + m1, h2 * 60 + m2, parse_rate(rate)))
+    return schedule
+
+
+class BandwidthShaper:
+    """Global and per-job download rate caps shared by every transfer of an engine.
+
+    Transfers call `consume(job, n)` for each chunk they receive and are held back until both
+    the job's bucket and the global one allow it. When several transfers wait for the global
+    bucket, the best ranked goes first: a job marked with `favor()` (the one feeding a
+    preview), then higher priority, then the oldest submission; lower ranks get what the
+    better ones leave unused. `schedule` entries (start minute, end minute, rate) override
+    `rate` by local time of day, and `reserve()` holds bandwidth back for traffic the engine
+    does not carry itself, such as a player streaming a remote preview. All setters apply to
+    running transfers immediately.
+
+    Favoring and reserving need a cap to work under. Without one, a little less than the
+    link capacity measured from the transfers themselves (`capacity`, the best rate seen over
+    a second) is used while either is active, so the queue forms here rather than in the network.
+    """
+    def __init__(self, rate=None, schedule=(), burst=1.0, metrics=None):
+        self.rate = rate
+        self.schedule = list(schedule)
+        self.burst = burst
+        self.metrics = metrics
+        self.reserved = 0
+        self.capacity = None        # bytes/s, measured
+        self._window = [time.monotonic(), 0]     # start, bytes received since
+        self._global = None
+        self._jobs = {}             # job -> TokenBucket
+        self._favored = set()
+        self._waiting = {}          # ticket -> (rank, job)
+        self._tickets = 0
+        self._cond = threading.Condition()
+
+    # --- SETTINGS ---
+    def set_rate(self, rate):
+        with self._cond:
+            self.rate = rate or None
+            self._cond.notify_all()
+
+    def set_schedule(self, schedule):
+        with self._cond:
+            self.schedule = list(schedule)
+            self._cond.notify_all()
+
+    def reserve(self, rate):
+        """Keeps `rate` bytes/s of the global cap free (0 releases it)."""
+        with self._cond:
+            self.reserved = rate or 0
+            self._cond.notify_all()
+
+    def set_job_rate(self, job, rate):
+        with self._cond:
+            if not rate: self._jobs.pop(job, None)
+            elif job in self._jobs: self._jobs[job].rate = rate
+            else: self._jobs[job] = TokenBucket(rate, self.burst)
+            self._cond.notify_all()
+
+    def forget(self, job):
+        """Drops the job's own cap and favor; for jobs that are finished or cancelled."""
+        with self._cond:
+            self._jobs.pop(job, None)
+            self._favored.discard(job)
+            self._cond.notify_all()
+
+    def job_rate(self, job):
+        bucket = self._jobs.get(job)
+        return bucket.rate if bucket else None
+
+    def favor(self, job, on=True):
+        with self._cond:
+            if on: self._favored.add(job)
+            else: self._favored.discard(job)
+            self._cond.notify_all()
+
+    def current_rate(self):
+        """The global cap in force right now, after the schedule and any reservation."""
+        rate = self.rate
+        if self.schedule:
+            now = time.localtime()
+            minute = now.tm_hour * 60 + now.tm_min
+            for start, end, value in self.schedule:
+                if start <= minute < end or end <= start and (minute >= start or minute < end):
+                    rate = value
+                    break
+        if not rate and (self.reserved or self._favored) and self.capacity:
+            rate = int(self.capacity * LINK_SHARE)
+        if rate and self.reserved: rate = max(MIN_RATE, rate - self.reserved)
+        return rate
+
+    # --- TRANSFERS ---
+    def consume(self, job, nbytes):
+        """Blocks until `job` may receive `nbytes` more bytes."""
+        self._measure(nbytes)
+        if (self.rate is None and not self.schedule and not self._jobs
+                and not (self.reserved or self._favored)): return
+        waited = 0.0
+        with self._cond:
+            self._tickets += 1
+            ticket = self._tickets
+            self._waiting[ticket] = ((job not in self._favored, -job.priority, job.seq or 0), job)
+            try:
+                while True:
+                    delay = self._try_take(ticket, job, nbytes)
+                    if delay is None: break
+                    start = time.monotonic()
+                    self._cond.wait(min(delay, 0.25))
+                    waited += time.monotonic() - start
+            finally:
+                del self._waiting[ticket]
+                self._cond.notify_all()
+        if waited and self.metrics is not None: self.metrics.inc('bandwidth_wait_seconds_total', waited)
+
+    def _measure(self, nbytes):
+        with self._cond:
+            now = time.monotonic()
+            self._window[1] += nbytes
+            elapsed = now - self._window[0]
+            if elapsed < 1.0: return
+            seen = self._window[1] / elapsed
+            self._window = [now, 0]
+            # The best seen so far: quiet spells and shaped (or capped) traffic say nothing about the link
+            if self.capacity is None or seen > self.capacity: self.capacity = seen
+
+    def _try_take(self, ticket, job, nbytes):
+        """Takes the tokens and returns None, or returns how long to wait before trying again."""
+        now = time.monotonic()
+        own = self._jobs.get(job)
+        if own is not None:
+            own.refill(now)
+            if own.tokens <= 0: return own.delay()
+        rate = self.current_rate()
+        if rate:
+            if self._global is None: self._global = TokenBucket(rate, self.burst)
+            self._global.rate = rate
+            self._global.refill(now)
+            if self._global.tokens <= 0: return self._global.delay()
+            # Only transfers held back by the global cap compete for it
+            rank = self._waiting[ticket][0]
+            for other, (other_rank, other_job) in self._waiting.items():
+                bucket = self._jobs.get(other_job)
+                if other != ticket and other_rank < rank and (bucket is None or bucket.tokens > 0): return 0.05
+            self._global.tokens -= nbytes
+        else:
+            self._global = None
+        if own is not None: own.tokens -= nbytes
+        return None
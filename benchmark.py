@@ -0,0 +1,450 @@
+"""Offline benchmark: runs the download engine against a local stand-in media server.
+
+    python benchmark.py -o bench.json              # every scenario
+    python benchmark.py --only hls_latency dash    # a subset
+    python benchmark.py --only startup             # cold start only
+
+Each scenario starts a MediaServer serving synthetic (seeded, so byte-identical between runs)
+progressive files, HLS playlists or DASH manifests with the configured latency, per-connection
+bandwidth, range support, connection cap and injected failures. The engine analyzes the URL
+and downloads it, while a sampler records time to first byte, UI board pressure, RSS and
+thread count. The JSON written with -o is meant to be diffed between commits.
+
+The startup benchmark launches fresh interpreters and times them until the front end is
+interactive (the GUI window drawn), then the first analysis a moment later. Only with
+customtkinter and a display is that time to interactive. Without a display it is the time
+to the same engine, journal and thumbnail set-up headless (`ready_s`), with customtkinter
+still imported when installed, since it pulls in modules (PIL) the headless set-up defers.
+"""
+import argparse
+import hashlib
+import importlib.util
+import json
+import os
+import platform
+import random
+import re
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+MB = 2**20
+
+# server: MediaServer options; kind: progressive | hls | dash; jobs: parallel downloads of the URL
+SCENARIOS = {
+    "progressive_fast":     {'kind': "progressive", 'size': 32 * MB, 'server': {}},
+    "progressive_capped":   {'kind': "progressive", 'size': 16 * MB, 'server': {'latency': 0.02, 'bandwidth': 4 * MB}},
+    "progressive_no_range": {'kind': "progressive", 'size': 8 * MB, 'server': {'latency': 0.02, 'bandwidth': 4 * MB, 'ranges': False}},
+    "hls_latency":          {'kind': "hls", 'fragments': 80, 'fragment_size': 256 * 1024, 'server': {'latency': 0.05, 'bandwidth': 4 * MB}},
+    "hls_saturated":        {'kind': "hls", 'fragments': 80, 'fragment_size': 256 * 1024, 'server': {'latency': 0.02, 'bandwidth': 4 * MB, 'max_connections': 4}},
+    "hls_flaky":            {'kind': "hls", 'fragments': 60, 'fragment_size': 256 * 1024, 'server': {'latency': 0.02, 'failure_rate': 0.05}},
+    "dash":                 {'kind': "dash", 'fragments': 60, 'fragment_size': 256 * 1024, 'server': {'latency': 0.03, 'bandwidth': 8 * MB}},
+    "parallel_jobs":        {'kind': "progressive", 'size': 8 * MB, 'jobs': 3, 'server': {'latency': 0.02, 'bandwidth': 4 * MB}},
+}
+
+
+def synthetic(name, size, seed=0):
+    return random.Random(f"{seed}:{name}").randbytes(size)
+
+
+class MediaServer:
+    """Threaded local HTTP server with reproducible network conditions.
+
+    latency          seconds slept before each response
+    bandwidth        bytes/s per connection (None = unthrottled)
+    ranges           honour Range requests and advertise Accept-Ranges
+    max_connections  media requests beyond this many in flight get 429
+    failure_rate     share of media requests answered 503, decided by a seeded RNG per
+                     (path, attempt) so the same requests fail on every run
+    """
+    def __init__(self, latency=0.0, bandwidth=None, ranges=True, max_connections=None, failure_rate=0.0, seed=0):
+        self.latency, self.bandwidth, self.ranges = latency, bandwidth, ranges
+        self.max_connections, self.failure_rate, self.seed = max_connections, failure_rate, seed
+        self.files = {}             # path -> (content type, bytes)
+        self.stats = {'requests': 0, 'bytes': 0, 'failed': 0, 'throttled': 0, 'connections': 0}
+        self.first_byte = None      # perf_counter() of the first media body byte since mark()
+        self._attempts = {}
+        self._active = 0
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                with server._lock: server.stats['connections'] += 1
+
+            def handle(self):
+                try:
+                    super().handle()
+                except ConnectionResetError:    # a client exited with the connection kept alive
+                    pass
+
+            def do_HEAD(self):
+                server._serve(self, body=False)
+
+            def do_GET(self):
+                server._serve(self, body=True)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+
+    @property
+    def base(self):
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}"
+
+    def start(self):
+        threading.Thread(target=self.httpd.serve_forever, name="media-server", daemon=True).start()
+        return self
+
+    def mark(self):
+        """Starts timing: analysis traffic before this does not count as the first byte."""
+        self.first_byte = None
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    # --- CONTENT ---
+    def add_progressive(self, size):
+        self.files["/video.mp4"] = ("video/mp4", synthetic("video.mp4", size, self.seed))
+        return self.base + "/video.mp4", self.files["/video.mp4"][1]
+
+    def add_hls(self, fragments, fragment_size):
+        lines = ["#EXTM3U", "#EXT-X-VERSION:3", "#EXT-X-TARGETDURATION:2", "#EXT-X-MEDIA-SEQUENCE:0"]
+        expected = []
+        for i in range(fragments):
+            data = synthetic(f"hls{i}", fragment_size, self.seed)
+            self.files[f"/hls/seg{i}.ts"] = ("video/mp2t", data)
+            expected.append(data)
+            lines += ["#EXTINF:2.0,", f"seg{i}.ts"]
+        lines.append("#EXT-X-ENDLIST")
+        self.files["/hls/index.m3u8"] = ("application/vnd.apple.mpegurl", ("\n".join(lines) + "\n").encode())
+        return self.base + "/hls/index.m3u8", b"".join(expected)
+
+    def add_dash(self, fragments, fragment_size):
+        init = synthetic("dash-init", 1024, self.seed)
+        self.files["/dash/init.mp4"] = ("video/mp4", init)
+        expected = [init]
+        for i in range(fragments):
+            data = synthetic(f"dash{i}", fragment_size, self.seed)
+            self.files[f"/dash/seg{i}.m4s"] = ("video/iso.segment", data)
+            expected.append(data)
+        mpd = f"""<?xml version="1.0" encoding="UTF-8"?>
+<MPD xmlns="urn:mpeg:dash:schema:mpd:2011" type="static" mediaPresentationDuration="PT{fragments * 2}S"
+     minBufferTime="PT2S" profiles="urn:mpeg:dash:profile:isoff-live:2011">
+  <Period>
+    <AdaptationSet mimeType="video/mp4" codecs="avc1.4d401f,mp4a.40.2">
+      <Representation id="main" bandwidth="2000000" width="1280" height="720">
+        <SegmentTemplate timescale="1" duration="2" startNumber="0" initialization="init.mp4" media="seg$Number$.m4s"/>
+      </Representation>
+    </AdaptationSet>
+  </Period>
+</MPD>
+"""
+        self.files["/dash/manifest.mpd"] = ("application/dash+xml", mpd.encode())
+        return self.base + "/dash/manifest.mpd", b"".join(expected)
+
+    # --- SERVING ---
+    def _serve(self, handler, body):
+        path = handler.path.split("?", 1)[0]
+        entry = self.files.get(path)
+        if self.latency: time.sleep(self.latency)
+        if entry is None: return self._empty(handler, 404)
+        ctype, data = entry
+        media = not ctype.startswith("application/")
+        with self._lock:
+            self.stats['requests'] += 1
+            if media and body:
+                attempt = self._attempts[path] = self._attempts.get(path, 0) + 1
+                if self.failure_rate and random.Random(f"{self.seed}:{path}:{attempt}").random() < self.failure_rate:
+                    self.stats['failed'] += 1
+                    return self._empty(handler, 503)
+                if self.max_connections and self._active >= self.max_connections:
+                    self.stats['throttled'] += 1
+                    return self._empty(handler, 429)
+                self._active += 1
+        try:
+            start, end = 0, len(data) - 1
+            match = self.ranges and re.fullmatch(r"bytes=(\d+)-(\d*)", handler.headers.get("Range") or "")
+            if match:
+                start = int(match.group(1))
+                if match.group(2): end = min(end, int(match.group(2)))
+                if start > end:
+                    handler.send_response(416)
+                    handler.send_header("Content-Range", f"bytes */{len(data)}")
+                    handler.send_header("Content-Length", "0")
+                    return handler.end_headers()
+                handler.send_response(206)
+                handler.send_header("Content-Range", f"bytes {start}-{end}/{len(data)}")
+            else:
+                handler.send_response(200)
+            if self.ranges: handler.send_header("Accept-Ranges", "bytes")
+            handler.send_header("Content-Type", ctype)
+            handler.send_header("Content-Length", str(end - start + 1))
+            handler.end_headers()
+            if body:
+                if media and self.first_byte is None: self.first_byte = time.perf_counter()
+                self._send(handler, memoryview(data)[start:end + 1])
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            if media and body:
+                with self._lock: self._active -= 1
+
+    def _send(self, handler, view, chunk=64 * 1024):
+        started = time.monotonic()
+        for offset in range(0, len(view), chunk):
+            handler.wfile.write(view[offset:offset + chunk])
+            with self._lock: self.stats['bytes'] += min(chunk, len(view) - offset)
+            if self.bandwidth:
+                ahead = (offset + chunk) / self.bandwidth - (time.monotonic() - started)
+                if ahead > 0: time.sleep(ahead)
+
+    def _empty(self, handler, status):
+        handler.send_response(status)
+        handler.send_header("Content-Length", "0")
+        handler.end_headers()
+
+
+def _rss():
+    try:
+        with open("/proc/self/statm") as f: return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _disk_written():
+    """Bytes this process has sent to the block layer so far, or None where that isn't reported."""
+    try:
+        with open("/proc/self/io") as f:
+            return next(int(line.split()[1]) for line in f if line.startswith("write_bytes:"))
+    except (OSError, StopIteration, ValueError):
+        return None
+
+
+class _Sampler(threading.Thread):
+    """Watches a running scenario: first progress shown, a 10 Hz UI-style drain, RSS and threads."""
+    def __init__(self, engine, jobs, started):
+        super().__init__(name="bench-sampler", daemon=True)
+        self.engine, self.jobs, self.started = engine, jobs, started
+        self.first_progress = {}
+        self.drains = []
+        self.peak_rss = _rss()
+        self.base_threads = self.peak_threads = threading.active_count()
+        self.stopped = threading.Event()
+
+    def run(self):
+        next_drain = time.perf_counter() + 0.1
+        while not self.stopped.wait(0.01):
+            self.sample()
+            now = time.perf_counter()
+            if now >= next_drain:
+                self.drains.append(len(self.engine.progress.drain()))
+                next_drain += 0.1
+            self.peak_rss = max(self.peak_rss, _rss())
+            self.peak_threads = max(self.peak_threads, threading.active_count())
+        self.sample()
+
+    def sample(self):
+        now = time.perf_counter()
+        for job in self.jobs:
+            p = self.engine.progress.get(job)
+            if job not in self.first_progress and p and p.downloaded: self.first_progress[job] = now - self.started
+
+
+def run_scenario(name, spec, workdir, timeout=300):
+    from engine import DownloadEngine
+
+    server = MediaServer(**spec['server']).start()
+    if spec['kind'] == "progressive": url, expected = server.add_progressive(spec['size'])
+    elif spec['kind'] == "hls": url, expected = server.add_hls(spec['fragments'], spec['fragment_size'])
+    else: url, expected = server.add_dash(spec['fragments'], spec['fragment_size'])
+
+    os.environ["AVD_HOME"] = os.path.join(workdir, name, "home")
+    out = os.path.join(workdir, name, "out")
+    os.makedirs(out, exist_ok=True)
+    engine = DownloadEngine(spec.get('profile', "default"), max_jobs=spec.get('max_jobs', 3),
+                            max_connections=spec.get('max_connections', 24))
+    try:
+        t = time.perf_counter()
+        engine.probe_sizes(url, engine.extract(url))
+        analyze_cold = time.perf_counter() - t
+        t = time.perf_counter()
+        engine.extract(url)
+        analyze_warm = time.perf_counter() - t
+
+        publishes = engine.progress.publishes
+        server.mark()
+        written = _disk_written()
+        started = time.perf_counter()
+        jobs = []
+        sampler = _Sampler(engine, jobs, started)
+        sampler.start()
+        jobs += [engine.submit(url, "best", out, f"{name}-{i}") for i in range(spec.get('jobs', 1))]
+        for job in jobs: job.done.wait(timeout)
+        elapsed = time.perf_counter() - started
+        if written is not None: written = _disk_written() - written
+        sampler.stopped.set()
+        sampler.join()
+    finally:
+        engine.http.close()
+        server.stop()
+
+    digest = hashlib.sha1(expected).hexdigest()
+    outputs = [f for f in os.listdir(out) if not f.endswith((".part", ".ytdl"))]
+    verified = sum(hashlib.sha1(open(os.path.join(out, f), "rb").read()).hexdigest() == digest for f in outputs)
+    first_progress = list(sampler.first_progress.values())
+    total_bytes = len(expected) * len(jobs)
+    return {
+        'jobs': len(jobs),
+        'states': sorted(job.state for job in jobs),
+        'errors': [job.error for job in jobs if job.error],
+        'verified': verified == len(jobs),
+        'bytes': total_bytes,
+        'elapsed_s': round(elapsed, 3),
+        'throughput_mib_s': round(total_bytes / elapsed / MB, 2),
+        'ttfb_s': round(server.first_byte - started, 3) if server.first_byte else None,
+        'first_progress_s': round(statistics.median(first_progress), 3) if first_progress else None,
+        'analyze_cold_s': round(analyze_cold, 3),
+        'analyze_warm_s': round(analyze_warm, 4),
+        'disk_written_mib': round(written / MB, 2) if written is not None else None,
+        'peak_rss_mib': round(sampler.peak_rss / MB, 1),
+        'peak_threads': sampler.peak_threads,
+        'threads_added': sampler.peak_threads - sampler.base_threads,
+        'ui': {
+            'publishes': engine.progress.publishes - publishes,
+            'ticks': len(sampler.drains),
+            'max_per_tick': max(sampler.drains, default=0),
+            'mean_per_tick': round(statistics.fmean(sampler.drains), 2) if sampler.drains else 0,
+        },
+        'server': dict(server.stats),
+    }
+
+
+# --- STARTUP ---
+_STARTUP_CHILD = r"""
+import json, os, sys, time
+t = time.perf_counter()
+sys.path.insert(0, os.environ["AVD_BENCH_ROOT"])
+if os.environ.get("AVD_BENCH_GUI"):
+    import main
+    app = main.ProDownloader()
+    app.update()
+    engine = app.engine
+else:
+    if os.environ.get("AVD_BENCH_TOOLKIT"): import customtkinter
+    from engine import DownloadEngine
+    from journal import JobJournal
+    from metrics import Metrics
+    from thumbnails import ThumbnailCache
+    engine = DownloadEngine(journal=JobJournal(), metrics=Metrics())
+    ThumbnailCache(http=engine.http, metrics=engine.metrics)
+    engine.restore()
+    if hasattr(engine, "warm"): engine.warm()
+ready = time.perf_counter() - t
+deferred = [m for m in ("yt_dlp", "PIL", "vlc") if m not in sys.modules]
+print(json.dumps({'ready_s': ready, 'deferred': deferred}), flush=True)
+time.sleep(1.0)                 # the user pastes a URL
+t = time.perf_counter()
+engine.extract(sys.argv[1])
+print(json.dumps({'first_analyze_s': time.perf_counter() - t}), flush=True)
+if os.environ.get("AVD_BENCH_GUI"): app.destroy()
+"""
+
+
+def _toolkit_available():
+    return importlib.util.find_spec("customtkinter") is not None
+
+
+def _gui_available():
+    return _toolkit_available() and (platform.system() == "Windows" or bool(os.environ.get("DISPLAY")))
+
+
+def run_startup(workdir, repeats=5, root=None):
+    """Median cold start over `repeats` fresh interpreters; `root` is the tree to time."""
+    server = MediaServer().start()
+    url, _ = server.add_progressive(MB)
+    gui = _gui_available()
+    env = {**os.environ, 'AVD_HOME': os.path.join(workdir, "startup", "home"),
+           'AVD_BENCH_ROOT': root or os.path.dirname(os.path.abspath(__file__))}
+    if gui: env['AVD_BENCH_GUI'] = "1"
+    elif _toolkit_available(): env['AVD_BENCH_TOOLKIT'] = "1"
+    runs = []
+    try:
+        for _ in range(repeats):
+            t = time.perf_counter()
+            proc = subprocess.Popen([sys.executable, "-c", _STARTUP_CHILD, url], stdout=subprocess.PIPE, text=True, env=env)
+            ready = json.loads(proc.stdout.readline())
+            interactive = time.perf_counter() - t
+            analyze = json.loads(proc.stdout.readline() or "{}")
+            proc.wait(60)
+            # Each run analyzes the same URL; drop the info cache so every first analysis is cold
+            shutil.rmtree(os.path.join(env['AVD_HOME'], "cache"), ignore_errors=True)
+            runs.append({'interactive_s': interactive, 'in_process_s': ready['ready_s'],
+                         'first_analyze_s': analyze.get('first_analyze_s'), 'deferred': ready['deferred']})
+    finally:
+        server.stop()
+    median = lambda key: round(statistics.median(r[key] for r in runs), 3) if all(r[key] is not None for r in runs) else None
+    return {
+        'front_end': "gui" if gui else "headless+toolkit" if _toolkit_available() else "headless",
+        'runs': repeats,
+        # Without a window nothing is interactive; the same measurement is only the set-up time
+        'time_to_interactive_s' if gui else 'ready_s': median('interactive_s'),
+        'in_process_s': median('in_process_s'),
+        'first_analyze_s': median('first_analyze_s'),
+        'deferred_modules': runs[-1]['deferred'],
+    }
+
+
+def _meta():
+    import yt_dlp
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {'commit': commit, 'python': platform.python_version(), 'yt_dlp': yt_dlp.version.__version__,
+            'platform': platform.platform(), 'cpus': os.cpu_count()}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n", 1)[0])
+    parser.add_argument("-o", "--output", help="write results as JSON to this file")
+    parser.add_argument("--only", nargs="+", choices=sorted(SCENARIOS) + ["startup"], metavar="NAME", help="scenarios to run")
+    parser.add_argument("--keep", action="store_true", help="keep the downloaded files and caches")
+    parser.add_argument("--startup-root", metavar="DIR", help="time the start-up of another checkout (e.g. a git worktree)")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="avd-bench-")
+    results = {'meta': _meta(), 'scenarios': {}}
+    try:
+        if not args.only or "startup" in args.only:
+            result = results['startup'] = run_startup(workdir, root=args.startup_root)
+            ready = f"interactive {result['time_to_interactive_s']}s" if 'time_to_interactive_s' in result else f"ready {result['ready_s']}s"
+            print(f"{'startup (' + result['front_end'] + ')':22} {ready}  "
+                  f"first analyze {result['first_analyze_s']}s  deferred {','.join(result['deferred_modules']) or '-'}", flush=True)
+        for name in args.only or SCENARIOS:
+            if name == "startup": continue
+            result = results['scenarios'][name] = run_scenario(name, SCENARIOS[name], workdir)
+            print(f"{name:22} {result['throughput_mib_s']:8.2f} MiB/s  ttfb {result['ttfb_s']}s  "
+                  f"{'ok' if result['verified'] else 'FAILED ' + ','.join(result['states'])}", flush=True)
+    finally:
+        if not args.keep: shutil.rmtree(workdir, ignore_errors=True)
+    if args.output:
+        with open(args.output, "w") as f: json.dump(results, f, indent=2, sort_keys=True)
+    return 0 if all(r['verified'] for r in results['scenarios'].values()) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
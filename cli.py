@@ -0,0 +1,266 @@
+import argparse
+import json
+import os
+import sys
+import time
+import urllib.request
+
+from bandwidth import parse_rate, parse_schedule
+from daemon import DEFAULT_ADDRESS, is_loopback
+
+
+def _engine(args, journal=None):
+    from engine import DownloadEngine
+    from archive import DownloadArchive
+    from bandwidth import BandwidthShaper
+    from metrics import Metrics
+    return DownloadEngine(args.profile, max_jobs=args.jobs, max_connections=args.connections, journal=journal,
+                          metrics=Metrics(trace=args.trace), archive=DownloadArchive(hash_files=args.hash_files),
+                          bandwidth=BandwidthShaper(args.limit_rate, args.schedule or ()))
+
+
+def _remote(args, path, payload=None):
+    data = json.dumps(payload).encode() if payload is not None else None
+    headers = {"Content-Type": "application/json"}
+    if args.token: headers["Authorization"] = f"Bearer {args.token}"
+    req = urllib.request.Request(args.remote.rstrip("/") + path, data=data, headers=headers)
+    with urllib.request.urlopen(req) as resp:
+        return json.load(resp)
+
+
+def _watch(engine, jobs):
+    """Prints progress for `jobs` until all of them are finished. Returns the failed ones."""
+    from engine import format_eta
+    from formats import format_bytes
+    pending = list(jobs)
+    while pending:
+        time.sleep(0.5)
+        for job, p in engine.progress.drain().items():
+            if p.status == "downloading":
+                pct = f"{p.downloaded / p.total:6.1%}" if p.total else "   ?  "
+                print(f"[{job.id}] {pct} {format_bytes(p.speed)}/s ETA {format_eta(p.eta)}  {job.name}", flush=True)
+            else:
+                print(f"[{job.id}] {p.status}  {job.name}", flush=True)
+        pending = [j for j in pending if not j.done.is_set()]
+    failed = [j for j in jobs if j.state != "done"]
+    for job in failed: print(f"[{job.id}] {job.state}: {job.error or ''}", file=sys.stderr)
+    return failed
+
+
+def _print_analysis(args, url, result):
+    if args.json:
+        print(json.dumps({'url': url, **result}), flush=True)
+    else:
+        print(f"{result['title']}  <{url}>")
+        for label in result['formats']: print("  " + label)
+        sys.stdout.flush()
+
+
+def cmd_analyze(args):
+    """Analyzes URLs, playlists and channels, printing each entry as soon as it is ready."""
+    if args.remote:
+        for url in args.urls: _print_analysis(args, url, _remote(args, "/analyze", {'url': url}))
+        return 0
+    engine = _engine(args)
+    failures = []
+
+    def on_result(index, url, info):
+        catalog = engine.catalog(info)
+        _print_analysis(args, url, {'title': info.get('title'), 'formats': [label for label, _ in catalog.choices()],
+                                    'catalog': [f.as_dict() for f in catalog.formats]})
+
+    def on_error(index, url, exc):
+        failures.append(url)
+        print(f"error: {url}: {exc}", file=sys.stderr, flush=True)
+
+    engine.analyze_batch(args.urls, on_result, on_error, workers=args.workers).done.wait()
+    return 1 if failures else 0
+
+
+def _submit(args, entries):
+    if args.queue:
+        from workqueue import open_queue
+        queue = open_queue(args.queue, args.token)
+        for url, fid in entries:
+            job_id = queue.put(url, fid, os.path.abspath(args.output), args.name, rate=args.rate, profile=args.profile)
+            print(f"[{job_id}] queued for workers  {url}")
+        return 0
+    if args.remote:
+        for url, fid in entries:
+            job = _remote(args, "/jobs", {'url': url, 'format_id': fid, 'path': args.output, 'name': args.name,
+                                          'rate': args.rate})
+            print(f"[{job['id']}] queued on {args.remote}  {url}")
+        return 0
+    engine = _engine(args)
+    jobs = [engine.submit(url, fid, args.output, args.name, rate=args.rate) for url, fid in entries]
+    return 1 if _watch(engine, jobs) else 0
+
+
+def cmd_download(args):
+    return _submit(args, [(args.url, args.format)])
+
+
+def cmd_batch(args):
+    """FILE holds one job per line: URL [FORMAT_ID or catalog query]. Blank lines and # comments are skipped."""
+    entries = []
+    with open(args.file) as f:
+        for line in f:
+            parts = line.split("#", 1)[0].split()
+            if parts: entries.append((parts[0], parts[1] if len(parts) > 1 else args.format))
+    return _submit(args, entries)
+
+
+def cmd_limit(args):
+    """Changes the global cap (or one job's with --job) of a running daemon."""
+    if not args.remote:
+        print("error: limit changes a running daemon; pass --remote URL", file=sys.stderr)
+        return 2
+    if args.job is not None:
+        job = _remote(args, f"/jobs/{args.job}/rate", {'rate': args.rate})
+        print(f"[{job['id']}] rate cap: {job['rate'] or 'none'}")
+    else:
+        state = _remote(args, "/bandwidth", {'rate': args.rate})
+        print(f"global rate cap: {state['rate'] or 'none'} (in force now: {state['current'] or 'none'})")
+    return 0
+
+
+def cmd_queue(args):
+    """Lists the jobs of a worker queue, or cancels one with --cancel."""
+    from formats import format_bytes
+    from workqueue import open_queue
+    queue = open_queue(args.queue, args.token)
+    if args.cancel is not None:
+        if not queue.cancel(args.cancel):
+            print(f"error: job {args.cancel} is not in the queue or already finished", file=sys.stderr)
+            return 1
+        return 0
+    for job in queue.jobs():
+        pct = f"{job['downloaded'] / job['total']:6.1%}" if job['total'] else "      "
+        where = f" on {job['worker']}" if job['worker'] else ""
+        print(f"[{job['id']}] {job['state']:9} {pct} {format_bytes(job['downloaded']):>9}{where}  {job['url']}"
+              + (f"  ({job['error']})" if job['error'] else ""))
+    return 0
+
+
+def _run_worker(args):
+    import signal
+    from workqueue import QueueWorker, open_queue
+    worker = QueueWorker(open_queue(args.queue, args.token), _engine(args), lease=args.lease)
+    signal.signal(signal.SIGTERM, lambda *_: worker.stop())
+    print(f"Worker {worker.name} taking jobs from {args.queue or worker.queue.path}", flush=True)
+    try:
+        worker.run()
+    except KeyboardInterrupt:
+        pass
+
+
+def cmd_worker(args):
+    """Runs worker processes that claim jobs from the queue until interrupted."""
+    if args.processes <= 1:
+        _run_worker(args)
+        return 0
+    import multiprocessing
+    # Each process has its own engine, interpreter and GIL; they only share the queue and caches
+    context = multiprocessing.get_context("spawn")
+    processes = [context.Process(target=_run_worker, args=(args,), name=f"worker-{i}") for i in range(args.processes)]
+    for p in processes: p.start()
+    try:
+        for p in processes: p.join()
+    except KeyboardInterrupt:
+        for p in processes: p.join()
+    return 0
+
+
+def cmd_daemon(args):
+    from daemon import serve
+    if not args.token and not is_loopback(args.host):
+        # Anyone who can reach the port could queue downloads and change the rate caps
+        print(f"error: serving on {args.host} needs --token (or AVD_TOKEN)", file=sys.stderr)
+        return 2
+    from journal import JobJournal
+    from paths import data_dir
+    # The daemon keeps its own journal so it never picks up jobs queued from the GUI
+    engine = _engine(args, JobJournal(os.path.join(data_dir(), "daemon-jobs.sqlite3")))
+    restored = engine.restore()
+    if restored: print(f"Resumed {len(restored)} unfinished job(s) from the journal", flush=True)
+    queue = None
+    if args.queue:
+        from workqueue import LeaseQueue
+        queue = LeaseQueue(args.queue)
+        print(f"Hosting worker queue {queue.path}", flush=True)
+    print(f"Serving download engine on http://{args.host}:{args.port}", flush=True)
+    serve(engine, args.host, args.port, queue, args.token)
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="avd", description="Headless front end for the download engine.")
+    parser.add_argument("--profile", default="default", help="yt-dlp option profile (default, bypass)")
+    parser.add_argument("--jobs", type=int, default=3, help="concurrent download jobs")
+    parser.add_argument("--connections", type=int, default=24, help="total fragment connections across jobs")
+    parser.add_argument("--remote", metavar="URL", help="send the request to a running daemon instead")
+    parser.add_argument("--queue", metavar="DB|URL",
+                        help="worker queue: an SQLite file, or the URL of a daemon hosting one; "
+                             "download and batch then queue jobs for `worker` processes")
+    parser.add_argument("--token", default=os.environ.get("AVD_TOKEN"),
+                        help="shared secret the daemon requires from every client (default: $AVD_TOKEN); "
+                             "give the same one to the daemon and to --remote, --queue URL and workers")
+    parser.add_argument("--trace", metavar="FILE", help="append a JSON-lines trace of phases and errors to FILE")
+    parser.add_argument("--hash-files", action="store_true",
+                        help="hash finished files and hardlink identical ones found under other videos or formats")
+    parser.add_argument("--limit-rate", type=parse_rate, metavar="RATE",
+                        help="cap on the combined download rate, e.g. 500k or 2M (bytes per second)")
+    parser.add_argument("--schedule", type=parse_schedule, metavar="SPEC",
+                        help="time-of-day caps overriding --limit-rate, e.g. '09:00-18:00=1M,01:00-07:00=0' (0 = none)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("analyze", help="show title and available formats (playlists are expanded)")
+    p.add_argument("urls", nargs="+", metavar="url")
+    p.add_argument("--json", action="store_true", help="one JSON object per line")
+    p.add_argument("--workers", type=int, default=4, help="entries extracted in parallel")
+    p.set_defaults(func=cmd_analyze)
+
+    for name, func, target in (("download", cmd_download, "url"), ("batch", cmd_batch, "file")):
+        p = sub.add_parser(name, help="download a single URL" if name == "download" else "download every URL listed in FILE")
+        p.add_argument(target)
+        p.add_argument("-f", "--format", default="bestvideo*",
+                       help="format id (video is merged with bestaudio) or a catalog query such as "
+                            "'best:size<=500M' or 'smallest:height>=720,vcodec=av1|vp9'")
+        p.add_argument("-o", "--output", default=os.getcwd(), help="output directory")
+        p.add_argument("-n", "--name", default="%(title)s", help="file name (yt-dlp template, no extension)")
+        p.add_argument("--rate", type=parse_rate, metavar="RATE", help="cap on each job's download rate")
+        p.set_defaults(func=func)
+
+    p = sub.add_parser("limit", help="change the rate caps of a running daemon (with --remote)")
+    p.add_argument("rate", type=parse_rate, help="bytes per second, e.g. 2M; 0 removes the cap")
+    p.add_argument("--job", type=int, metavar="ID", help="cap this job instead of the combined rate")
+    p.set_defaults(func=cmd_limit)
+
+    p = sub.add_parser("worker", help="claim and run jobs from the worker queue (see --queue)",
+                       description="Claims and runs jobs from the worker queue given with --queue. A daemon "
+                                   "hosting the queue for other hosts listens beyond loopback and so runs with "
+                                   "--token; pass its token to the workers (--token or AVD_TOKEN).")
+    p.add_argument("--processes", type=int, default=1, help="worker processes to start on this host")
+    p.add_argument("--lease", type=float, default=30.0, metavar="SECONDS",
+                   help="how long a claimed job stays with a worker that stopped sending heartbeats")
+    p.set_defaults(func=cmd_worker)
+
+    p = sub.add_parser("queue", help="list the jobs of the worker queue")
+    p.add_argument("--cancel", type=int, metavar="ID", help="cancel this job instead")
+    p.set_defaults(func=cmd_queue)
+
+    p = sub.add_parser("daemon", help="run the engine behind a local HTTP API; any --host other than "
+                                      "loopback requires --token")
+    p.add_argument("--host", default=DEFAULT_ADDRESS[0])
+    p.add_argument("--port", type=int, default=DEFAULT_ADDRESS[1])
+    p.set_defaults(func=cmd_daemon)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
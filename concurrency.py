@@ -0,0 +1,80 @@
+import threading
+import time
+from contextlib import contextmanager
+
+
+class AdaptiveLimit:
+    """AIMD limit on one job's concurrent fragment requests.
+
+    Every fragment that completes without queueing delay adds 1/limit (about +1 connection
+    per round of `limit` fragments). A throttling answer (429/503), any other fragment error,
+    or latency well above the best seen recently cuts the limit multiplicatively, at most
+    once per round. Each running request also holds one slot of the shared `budget`
+    semaphore, so all jobs together never exceed the global connection cap.
+    """
+    def __init__(self, ceiling, budget=None, initial=4, floor=1):
+        self.ceiling = max(floor, ceiling)
+        self.floor = floor
+        self.limit = float(min(initial, self.ceiling))
+        self.budget = budget
+        self.active = 0
+        self.completed = self.errors = self.throttled = 0
+        self.bytes = 0
+        self.busy = 0.0                 # summed request time, for per-connection throughput
+        self._base_latency = None       # best recent seconds per MiB
+        self._cut_at = 0.0
+        self._cond = threading.Condition()
+
+    @contextmanager
+    def slot(self):
+        with self._cond:
+            while self.active >= int(self.limit): self._cond.wait()
+            self.active += 1
+        if self.budget is not None: self.budget.acquire()
+        try:
+            yield
+        finally:
+            if self.budget is not None: self.budget.release()
+            with self._cond:
+                self.active -= 1
+                self._cond.notify()
+
+    def success(self, seconds, size):
+        with self._cond:
+            self.completed += 1
+            self.bytes += size
+            self.busy += seconds
+            if size <= 0: return
+            latency = seconds / (size / 2**20)
+            # Let the baseline drift up slowly so a permanently slower path is relearned
+            base = self._base_latency = min(latency, self._base_latency * 1.02) if self._base_latency else latency
+            if latency > 2.5 * base:
+                self._decrease(0.75)
+            else:
+                self.limit = min(self.ceiling, self.limit + 1 / self.limit)
+                self._cond.notify_all()
+
+    def failure(self, throttled=False):
+        with self._cond:
+            self.errors += 1
+            if throttled: self.throttled += 1
+            self._decrease(0.5)
+
+    def _decrease(self, factor):
+        now = time.monotonic()
+        if now - self._cut_at < self._round(): return
+        self._cut_at = now
+        self.limit = max(self.floor, self.limit * factor)
+
+    def _round(self):
+        """Roughly how long `limit` fragments take to come back at the current pace."""
+        if not self.completed: return 1.0
+        return max(0.25, self.busy / self.completed)
+
+    def stats(self):
+        with self._cond:
+            return {
+                'limit': int(self.limit), 'active': self.active, 'completed': self.completed,
+                'errors': self.errors, 'throttled': self.throttled,
+                'throughput': self.bytes / self.busy if self.busy else None,   # bytes/s per connection
+            }
@@ -0,0 +1,162 @@
+import hmac
+import ipaddress
+import json
+import re
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from bandwidth import parse_rate, parse_schedule
+
+DEFAULT_ADDRESS = ("127.0.0.1", 8765)
+
+
+def is_loopback(host):
+    try: return host == "localhost" or ipaddress.ip_address(host).is_loopback
+    except ValueError: return False
+
+
+class EngineRequestHandler(BaseHTTPRequestHandler):
+    """Local JSON API over a DownloadEngine.
+
+    GET  /jobs                      list jobs
+    GET  /jobs/<id>                 one job
+    GET  /metrics                   Prometheus text exposition
+    GET  /bandwidth                 rate caps (bytes per second, null = none)
+    POST /bandwidth {rate, schedule}  change the global cap or the time-of-day schedule
+    POST /analyze   {url}           title, format labels and the format catalog
+    POST /jobs      {url, format_id, path, name, priority, rate}   format_id may be a catalog query
+    POST /jobs/<id>/pause|resume|cancel|bump
+    POST /jobs/<id>/rate {rate}     change one job's cap
+
+    With a LeaseQueue (daemon --queue), workers on other hosts use it through:
+    GET  /queue                     list queued jobs
+    POST /queue     {url, format_id, path, name, priority, rate, profile}
+    POST /queue/claim {worker, limit, lease, profile}
+    POST /queue/heartbeat {worker, lease, progress: {id: [downloaded, total]}}
+    POST /queue/release {worker, ids}
+    POST /queue/<id>/finish {worker, state, error}
+    POST /queue/<id>/cancel
+
+    With a `token`, every request must carry ``Authorization: Bearer <token>`` or gets a 401.
+    """
+    engine = None
+    queue = None
+    token = None
+
+    def do_GET(self):
+        if not self._authorized(): return self._reply(401, {'error': 'missing or wrong token'})
+        if self.path == "/metrics":
+            data = self.engine.metrics.render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            return self.wfile.write(data)
+        if self.path == "/jobs":
+            return self._reply(200, [self.engine.describe(j) for j in list(self.engine.jobs.values())])
+        if self.path == "/bandwidth": return self._reply(200, self._bandwidth())
+        if self.path == "/queue" and self.queue is not None: return self._reply(200, self.queue.jobs())
+        m = re.fullmatch(r"/jobs/(\d+)", self.path)
+        job = m and self.engine.jobs.get(int(m.group(1)))
+        if not job: return self._reply(404, {'error': 'not found'})
+        self._reply(200, self.engine.describe(job))
+
+    def do_POST(self):
+        if not self._authorized(): return self._reply(401, {'error': 'missing or wrong token'})
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get('Content-Length') or 0)) or b"{}")
+        except ValueError:
+            return self._reply(400, {'error': 'invalid JSON body'})
+
+        if self.path.startswith("/queue") and self.queue is not None: return self._queue(body)
+
+        if self.path == "/analyze":
+            try:
+                info = self.engine.probe_sizes(body['url'], self.engine.extract(body['url']))
+            except Exception as e:
+                return self._reply(422, {'error': str(e)})
+            catalog = self.engine.catalog(info)
+            return self._reply(200, {'title': info.get('title'), 'formats': [label for label, _ in catalog.choices()],
+                                     'catalog': [f.as_dict() for f in catalog.formats]})
+
+        if self.path == "/bandwidth":
+            shaper = self.engine.bandwidth
+            try:
+                if 'rate' in body: shaper.set_rate(parse_rate(body['rate'] or 0))
+                if 'schedule' in body: shaper.set_schedule(parse_schedule(body['schedule'] or ""))
+            except ValueError as e:
+                return self._reply(400, {'error': str(e)})
+            return self._reply(200, self._bandwidth())
+
+        if self.path == "/jobs":
+            if not body.get('url'): return self._reply(400, {'error': 'url is required'})
+            try: rate = parse_rate(body.get('rate') or 0)
+            except ValueError as e: return self._reply(400, {'error': str(e)})
+            job = self.engine.submit(body['url'], body.get('format_id', 'bestvideo*'), body.get('path', '.'),
+                                     body.get('name', '%(title)s'), priority=int(body.get('priority', 0)), rate=rate)
+            return self._reply(201, self.engine.describe(job))
+
+        m = re.fullmatch(r"/jobs/(\d+)/(pause|resume|cancel|bump|rate)", self.path)
+        job = m and self.engine.jobs.get(int(m.group(1)))
+        if not job: return self._reply(404, {'error': 'not found'})
+        if m.group(2) == "rate":
+            try: self.engine.bandwidth.set_job_rate(job, parse_rate(body.get('rate') or 0))
+            except ValueError as e: return self._reply(400, {'error': str(e)})
+        else:
+            getattr(self.engine, m.group(2))(job)
+        self._reply(200, self.engine.describe(job))
+
+    def _queue(self, body):
+        q = self.queue
+        try:
+            if self.path == "/queue":
+                if not body.get('url'): return self._reply(400, {'error': 'url is required'})
+                job_id = q.put(body['url'], body.get('format_id', 'bestvideo*'), body.get('path', '.'),
+                               body.get('name', '%(title)s'), int(body.get('priority', 0)),
+                               parse_rate(body.get('rate') or 0), body.get('profile', 'default'))
+                return self._reply(201, {'id': job_id})
+            if self.path == "/queue/claim":
+                return self._reply(200, q.claim(body['worker'], int(body.get('limit', 1)), float(body.get('lease', 30)),
+                                                body.get('profile', 'default')))
+            if self.path == "/queue/heartbeat":
+                progress = {int(k): tuple(v) for k, v in body.get('progress', {}).items()}
+                return self._reply(200, {'held': q.heartbeat(body['worker'], progress, float(body.get('lease', 30)))})
+            if self.path == "/queue/release":
+                q.release(body['worker'], [int(i) for i in body.get('ids', ())])
+                return self._reply(200, {'ok': True})
+            m = re.fullmatch(r"/queue/(\d+)/(finish|cancel)", self.path)
+            if not m: return self._reply(404, {'error': 'not found'})
+            if m.group(2) == "cancel": return self._reply(200, {'ok': q.cancel(int(m.group(1)))})
+            return self._reply(200, {'ok': q.finish(int(m.group(1)), body['worker'], body['state'], body.get('error'))})
+        except (KeyError, ValueError) as e:
+            return self._reply(400, {'error': f"invalid request: {e}"})
+
+    def _authorized(self):
+        if self.token is None: return True
+        return hmac.compare_digest(self.headers.get("Authorization", "").encode(), f"Bearer {self.token}".encode())
+
+    def _bandwidth(self):
+        shaper = self.engine.bandwidth
+        return {'rate': shaper.rate, 'current': shaper.current_rate(), 'reserved': shaper.reserved,
+                'schedule': [{'start': f"{a // 60:02d}:{a % 60:02d}", 'end': f"{b // 60:02d}:{b % 60:02d}", 'rate': r}
+                             for a, b, r in shaper.schedule]}
+
+    def _reply(self, status, payload):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_server(engine, host=DEFAULT_ADDRESS[0], port=DEFAULT_ADDRESS[1], queue=None, token=None):
+    handler = type("BoundEngineRequestHandler", (EngineRequestHandler,), {'engine': engine, 'queue': queue, 'token': token})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def serve(engine, host=DEFAULT_ADDRESS[0], port=DEFAULT_ADDRESS[1], queue=None, token=None):
+    with make_server(engine, host, port, queue, token) as server:
+        server.serve_forever()
@@ -0,0 +1,587 @@
+import functools
+import json
+import mmap
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import yt_dlp
+from yt_dlp.downloader import get_suitable_downloader
+from yt_dlp.downloader.common import FileDownloader
+from yt_dlp.downloader.dash import DashSegmentsFD
+from yt_dlp.downloader.fragment import HttpQuietDownloader
+from yt_dlp.downloader.hls import HlsFD
+from yt_dlp.networking.exceptions import HTTPError, IncompleteRead
+from yt_dlp.utils import NO_DEFAULT, DownloadError, RetryManager
+
+from concurrency import AdaptiveLimit
+from http_pool import RangeIgnored, RequestError
+from metrics import error_class
+
+MIN_SEGMENT = 1 << 20           # never split a range below this
+SEGMENT_THRESHOLD = 4 << 20     # smaller files come down on one connection
+WRITE_BEHIND = 64 << 20         # HLS/DASH fragments held in memory per job before spilling to disk
+
+
+class PauseDownload(yt_dlp.utils.DownloadCancelled):
+    msg = "Download paused"
+
+
+class CancelDownload(yt_dlp.utils.DownloadCancelled):
+    msg = "Download cancelled"
+
+
+class _SegmentDone(Exception):
+    """The segment was cut short by a split; the rest of the response belongs to another worker."""
+
+
+class _Stopped(Exception):
+    pass
+
+
+class _Segment:
+    """A byte range [pos, end] still to be written, with the throughput of its current owner."""
+    __slots__ = ('pos', 'end', 'owned', 'started', 'received')
+
+    def __init__(self, pos, end, owned=False):
+        self.pos, self.end, self.owned = pos, end, owned
+        self.started, self.received = time.monotonic(), 0
+
+    def remaining(self):
+        return self.end - self.pos + 1
+
+    def eta(self, now):
+        rate = self.received / max(now - self.started, 1e-3)
+        return self.remaining() / rate if rate else float('inf')
+
+
+class _RangeWriter:
+    """Positional writes into a preallocated file: os.pwrite where the OS has it, mmap elsewhere."""
+    def __init__(self, path, size):
+        self._file = open(path, 'r+b' if os.path.exists(path) else 'w+b')
+        if os.fstat(self._file.fileno()).st_size != size: self._file.truncate(size)
+        if hasattr(os, 'posix_fallocate'):
+            try: os.posix_fallocate(self._file.fileno(), 0, size)
+            except OSError: pass    # filesystems without fallocate stay sparse
+        self._map = None if hasattr(os, 'pwrite') else mmap.mmap(self._file.fileno(), size)
+
+    def write(self, offset, data):
+        if self._map is None:
+            while data:
+                written = os.pwrite(self._file.fileno(), data, offset)
+                data, offset = data[written:], offset + written
+        else:
+            self._map[offset:offset + len(data)] = data
+
+    def close(self):
+        if self._map is not None: self._map.close()
+        self._file.close()
+
+
+class PooledHttpFD(FileDownloader):
+    """Direct HTTP(S) downloader that streams through the engine's HttpPool.
+
+    Same contract as yt-dlp's HttpFD (.part file, resume by Range, progress hook dicts), but
+    the connection comes from the shared keep-alive pool instead of a fresh handshake per
+    download. Formats that ask for chunked requests (`http_chunk_size`) are fetched range by
+    range over the same connection.
+
+    Large files on servers that honour ranges are downloaded in segments over up to
+    `concurrent_fragment_downloads` connections, written in place into a preallocated .part
+    file. The remaining ranges are kept in the .ytdl file so paused downloads resume where
+    every segment stopped.
+    """
+    @staticmethod
+    def can_download(info_dict, params):
+        return (info_dict.get('protocol') in ('http', 'https') and not info_dict.get('is_live')
+                and not info_dict.get('impersonate') and not params.get('external_downloader')
+                and not (info_dict.get('section_start') or info_dict.get('section_end')))
+
+    def real_download(self, filename, info_dict):
+        url = info_dict['url']
+        headers = dict(info_dict.get('http_headers') or {})
+        cookie = self.ydl.cookiejar.get_cookie_header(url)
+        if cookie: headers['Cookie'] = cookie
+        verify = not self.params.get('nocheckcertificate')
+        chunk_size = (info_dict.get('downloader_options') or {}).get('http_chunk_size') or self.params.get('http_chunk_size') or 0
+
+        tmpfilename = self.temp_name(filename)
+        size, ranges = self.ydl.http.probe(url, headers, verify)
+        total = size or info_dict.get('filesize')
+        self.report_destination(filename)
+
+        segmented = os.path.isfile(self.ytdl_filename(filename))
+        if segmented and not (ranges and total):
+            # The .part file has holes only the segment list can describe; start over
+            self.report_unable_to_resume()
+            self.try_remove(self.ytdl_filename(filename))
+            self.try_remove(tmpfilename)
+        elif segmented or (ranges and total and total >= SEGMENT_THRESHOLD
+                           and (self.params.get('concurrent_fragment_downloads') or 1) > 1):
+            return self._download_segmented(filename, tmpfilename, info_dict, headers, verify, total, chunk_size)
+        with self.ydl.connection():
+            return self._download_sequential(filename, tmpfilename, info_dict, headers, verify, total, chunk_size)
+
+    def report_retry(self, err, count, retries, frag_index=NO_DEFAULT, fatal=True):
+        self.ydl.count_retry('http', err)
+        super().report_retry(err, count, retries, frag_index, fatal)
+
+    def _report(self, info_dict, filename, tmpfilename, downloaded, total, start, resume, written=None):
+        now = time.time()
+        speed = self.calc_speed(start, now, downloaded - resume)
+        status = {
+            'status': 'downloading',
+            'downloaded_bytes': downloaded,
+            'total_bytes': total,
+            'tmpfilename': tmpfilename,
+            'filename': filename,
+            'eta': self.calc_eta(speed, total - downloaded) if total and speed else None,
+            'speed': speed,
+            'elapsed': now - start,
+        }
+        # Segmented files have holes; without this key the written part is the file's prefix
+        if written is not None: status['written_ranges'] = written
+        self._hook_progress(status, info_dict)
+
+    def _finish(self, filename, tmpfilename, info_dict, downloaded, start, last_modified):
+        if self.params.get('updatetime'): self.try_utime(tmpfilename, last_modified)
+        self.try_rename(tmpfilename, filename)
+        self._hook_progress({
+            'downloaded_bytes': downloaded,
+            'total_bytes': downloaded,
+            'filename': filename,
+            'status': 'finished',
+            'elapsed': time.time() - start,
+        }, info_dict)
+        return True
+
+    # --- ONE CONNECTION ---
+    def _download_sequential(self, filename, tmpfilename, info_dict, headers, verify, total, chunk_size):
+        url, http = info_dict['url'], self.ydl.http
+        resume = os.path.getsize(tmpfilename) if self.params.get('continuedl', True) and os.path.isfile(tmpfilename) else 0
+        if resume: self.report_resuming_byte(resume)
+        state = {'downloaded': resume, 'last_modified': None}
+        start = time.time()
+
+        with open(tmpfilename, 'ab' if resume else 'wb') as f:
+            def write(chunk):
+                self.ydl.throttle(len(chunk))
+                f.write(chunk)
+                state['downloaded'] += len(chunk)
+                self._report(info_dict, filename, tmpfilename, state['downloaded'], total, start, resume)
+
+            while total is None or state['downloaded'] < total:
+                before = state['downloaded']
+                end = min(before + chunk_size, total or before + chunk_size) - 1 if chunk_size else None
+                for retry in RetryManager(self.params.get('retries'), self.report_retry):
+                    offset = state['downloaded']
+                    if offset or end is not None:
+                        headers['Range'] = f"bytes={offset}-{'' if end is None else end}"
+                    try:
+                        resp = http.stream(url, write, headers, verify)
+                        state['last_modified'] = resp.headers.get('Last-Modified')
+                    except RangeIgnored as e:
+                        # No range support: start over with one plain request
+                        self.report_unable_to_resume()
+                        f.seek(0)
+                        f.truncate()
+                        state['downloaded'] = before = resume = 0
+                        headers.pop('Range', None)
+                        chunk_size = end = None
+                        retry.error = e
+                    except RequestError as e:
+                        if getattr(getattr(e, 'response', None), 'status_code', None) == 416 and offset:
+                            total = offset     # the .part file already holds everything
+                            break
+                        retry.error = e
+                got = state['downloaded'] - before
+                if total is None and (not chunk_size or got < chunk_size) or not got:
+                    total = state['downloaded']
+
+        if not state['downloaded']:
+            self.report_error('Did not get any data blocks')
+            return False
+        return self._finish(filename, tmpfilename, info_dict, state['downloaded'], start, state['last_modified'])
+
+    # --- SEGMENTED ---
+    def _load_segments(self, state_file, tmpfilename, total):
+        if self.params.get('continuedl', True) and os.path.isfile(tmpfilename):
+            try:
+                with open(state_file) as f: state = json.load(f)
+                if state['total'] == total: return [_Segment(pos, end) for pos, end in state['segments']]
+            except (OSError, ValueError, KeyError, TypeError):
+                pass
+            # A partial file from a single-connection download is valid up to its size
+            size = os.path.getsize(tmpfilename)
+            if 0 < size < total:
+                self.report_resuming_byte(size)
+                return [_Segment(size, total - 1)]
+        return [_Segment(0, total - 1)]
+
+    def _save_segments(self, state_file, total, segments, lock):
+        with lock: live = [[s.pos, s.end] for s in segments if s.pos <= s.end]
+        tmp = state_file + '.tmp'
+        with open(tmp, 'w') as f: json.dump({'total': total, 'segments': live}, f)
+        os.replace(tmp, state_file)
+
+    def _download_segmented(self, filename, tmpfilename, info_dict, headers, verify, total, chunk_size):
+        """Splits the file into ranges fetched in parallel, growing the connection count while it pays off.
+
+        Starts on two connections and doubles them every second for as long as the connections
+        added last raised aggregate throughput by at least half a connection's share each, up to
+        `concurrent_fragment_downloads` and to what the shared connection budget has free. A worker that runs out of work takes the back half of
+        the range with the longest time to completion.
+        """
+        url, http, budget = info_dict['url'], self.ydl.http, self.ydl.budget
+        state_file = self.ytdl_filename(filename)
+        max_conns = max(1, self.params.get('concurrent_fragment_downloads') or 1)
+        retries = self.params.get('retries') or 0
+        segments = self._load_segments(state_file, tmpfilename, total)
+        resume = total - sum(s.remaining() for s in segments)
+        lock, wakeup, stop = threading.Lock(), threading.Event(), threading.Event()
+        counters = {'downloaded': resume, 'last_modified': None}
+        failures, workers = [], []
+
+        def take():
+            with lock:
+                now = time.monotonic()
+                live = [s for s in segments if s.pos <= s.end]
+                for seg in live:
+                    if not seg.owned:
+                        seg.owned, seg.started, seg.received = True, now, 0
+                        return seg
+                victim = max(live, key=lambda s: s.eta(now), default=None)
+                if victim is None or victim.remaining() < 2 * MIN_SEGMENT: return None
+                seg = _Segment(victim.pos + victim.remaining() // 2, victim.end, owned=True)
+                victim.end = seg.pos - 1
+                segments.append(seg)
+                return seg
+
+        def write(seg, chunk):
+            self.ydl.throttle(len(chunk))
+            if stop.is_set(): raise _Stopped()
+            with lock:
+                n = max(0, min(len(chunk), seg.end + 1 - seg.pos))
+                offset = seg.pos
+                seg.pos += n
+                seg.received += n
+                counters['downloaded'] += n
+            if n: writer.write(offset, memoryview(chunk)[:n])
+            if n < len(chunk): raise _SegmentDone()
+
+        def work():
+            errors, seg = 0, take()
+            while seg is not None and not stop.is_set():
+                try:
+                    while seg.pos <= seg.end and not stop.is_set():
+                        req_end = min(seg.end, seg.pos + chunk_size - 1) if chunk_size else seg.end
+                        resp = http.stream(url, functools.partial(write, seg),
+                                           {**headers, 'Range': f'bytes={seg.pos}-{req_end}'}, verify)
+                        counters['last_modified'] = resp.headers.get('Last-Modified')
+                    errors = 0
+                except _SegmentDone:
+                    pass
+                except _Stopped:
+                    break
+                except (RequestError, RangeIgnored, OSError) as e:
+                    self.ydl.count_retry('segment', e)
+                    errors += 1
+                    if errors > retries:
+                        failures.append(e)
+                        stop.set()
+                        break
+                    stop.wait(min(errors, 5))
+                    continue
+                with lock: seg.owned = False
+                seg = take()
+            wakeup.set()
+
+        def run():
+            try: work()
+            finally:
+                if budget is not None: budget.release()
+
+        def written():
+            """Inclusive (start, end) byte ranges already in the file."""
+            with lock: holes = sorted((s.pos, s.end) for s in segments if s.pos <= s.end)
+            ranges, pos = [], 0
+            for first, last in holes:
+                if first > pos: ranges.append((pos, first - 1))
+                pos = max(pos, last + 1)
+            if pos < total: ranges.append((pos, total - 1))
+            return ranges
+
+        def spawn():
+            # Extra connections only while the shared budget has room; the first one waits for it
+            if budget is not None and not budget.acquire(blocking=not workers): return False
+            t = threading.Thread(target=run, name=f"segment-{len(workers)}", daemon=True)
+            workers.append(t)
+            t.start()
+            return True
+
+        writer = _RangeWriter(tmpfilename, total)
+        start = time.time()
+        window, grown, growing = (time.monotonic(), resume), None, True   # grown: (rate, workers) before the last growth
+        saved = time.monotonic()
+        try:
+            for _ in range(min(2, max_conns)): spawn()
+            while any(t.is_alive() for t in workers):
+                wakeup.wait(0.2)
+                wakeup.clear()
+                if failures: break
+                self._report(info_dict, filename, tmpfilename, counters['downloaded'], total, start, resume, written())
+                now = time.monotonic()
+                if now - saved >= 1:
+                    self._save_segments(state_file, total, segments, lock)
+                    saved = now
+                if growing and now - window[0] >= 1:
+                    rate = (counters['downloaded'] - window[1]) / (now - window[0])
+                    alive = sum(t.is_alive() for t in workers)
+                    if grown and (rate - grown[0]) / max(alive - grown[1], 1) < 0.5 * grown[0] / grown[1]:
+                        growing = False     # the link or server is saturated
+                    elif alive < max_conns:
+                        grown = (rate, alive)
+                        for _ in range(min(alive, max_conns - alive)):
+                            if not spawn(): break
+                    window = (now, counters['downloaded'])
+            for t in workers: t.join()
+        except BaseException:
+            stop.set()
+            for t in workers: t.join()
+            self._save_segments(state_file, total, segments, lock)
+            raise
+        finally:
+            writer.close()
+
+        if failures:
+            self._save_segments(state_file, total, segments, lock)
+            self.report_error(f'unable to download {url}: {failures[0]}')
+            return False
+        self.try_remove(state_file)
+        return self._finish(filename, tmpfilename, info_dict, total, start, counters['last_modified'])
+
+
+class _FragmentBuffer(bytearray):
+    """In-memory stand-in for a fragment file, as far as HttpFD writes to one."""
+    locked = True               # no "locking unsupported" notice from sanitize_open
+
+    def write(self, data):
+        self.extend(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class _FragmentSink:
+    """Fragments of one job kept in memory, by the path yt-dlp would have written them to.
+
+    Holds up to `limit` bytes; fragments opened past that go to disk as usual.
+    """
+    def __init__(self, limit):
+        self.limit = limit
+        self._lock = threading.Lock()
+        self._buffers = {}
+
+    def open(self, path, mode):
+        """The buffer for `path` (emptied unless appending), or None to write a file instead."""
+        with self._lock:
+            buffer = self._buffers.get(path)
+            if buffer is None:
+                if sum(map(len, self._buffers.values())) >= self.limit: return None
+                buffer = self._buffers[path] = _FragmentBuffer()
+            elif 'a' not in mode:
+                buffer.clear()
+            return buffer
+
+    def rename(self, old, new):
+        with self._lock:
+            if old not in self._buffers: return False
+            self._buffers[new] = self._buffers.pop(old)
+            return True
+
+    def size(self, path):
+        with self._lock:
+            buffer = self._buffers.get(path)
+            return None if buffer is None else len(buffer)
+
+    def pop(self, path):
+        with self._lock: return self._buffers.pop(path, None)
+
+
+class _FragmentHttpFD(HttpQuietDownloader):
+    """yt-dlp's per-fragment HTTP downloader, with its retries counted and its reads shaped.
+
+    One instance serves all of a job's fragment threads; each thread tracks its own fragment.
+    With a `sink`, fragments are written to memory rather than to -Frag files while it has room.
+    """
+    def __init__(self, ydl, params, sink=None):
+        super().__init__(ydl, params)
+        self.sink = sink
+        self._shaped = threading.local()
+
+    def sanitize_open(self, filename, open_mode):
+        buffer = self.sink.open(filename, open_mode) if self.sink is not None and 'r' not in open_mode else None
+        if buffer is None: return super().sanitize_open(filename, open_mode)
+        return buffer, filename
+
+    def try_rename(self, old_filename, new_filename):
+        if self.sink is None or not self.sink.rename(old_filename, new_filename):
+            super().try_rename(old_filename, new_filename)
+
+    def slow_down(self, start_time, now, byte_counter):
+        shaped = self._shaped
+        if getattr(shaped, 'start', None) != start_time: shaped.start, shaped.count = start_time, 0
+        self.ydl.throttle(byte_counter - shaped.count)
+        shaped.count = byte_counter
+        super().slow_down(start_time, now, byte_counter)
+
+    def report_retry(self, err, count, retries, frag_index=NO_DEFAULT, fatal=True):
+        self.ydl.count_retry('fragment', err)
+        super().report_retry(err, count, retries, frag_index, fatal)
+
+
+class AdaptiveFragmentMixin:
+    """Runs each HLS/DASH fragment request under the YoutubeDL's AdaptiveLimit.
+
+    yt-dlp's pool still has `concurrent_fragment_downloads` threads, but only `limit` of them
+    download at once; the limit follows fragment latency and errors while the job runs.
+    Fragments are buffered in memory (up to WRITE_BEHIND per job) and written once, when
+    appended to the output, instead of going to disk and being read back; with
+    `keep_fragments` they stay files.
+    """
+    def _prepare_frag_download(self, ctx):
+        super()._prepare_frag_download(ctx)
+        sink = None if self.params.get('keep_fragments') else _FragmentSink(WRITE_BEHIND)
+        ctx['dl'] = _FragmentHttpFD(self.ydl, ctx['dl'].params, sink)
+
+    def report_retry(self, err, count, retries, frag_index=NO_DEFAULT, fatal=True):
+        self.ydl.count_retry('fragment', err)
+        super().report_retry(err, count, retries, frag_index, fatal)
+
+    def _download_fragment(self, ctx, frag_url, info_dict, headers=None, request_data=None):
+        limit = self.ydl.limit
+        with limit.slot():
+            started = time.monotonic()
+            try:
+                ok = super()._download_fragment(ctx, frag_url, info_dict, headers, request_data)
+            except HTTPError as e:
+                limit.failure(throttled=e.status in (429, 503))
+                raise
+            except (IncompleteRead, DownloadError):
+                limit.failure()
+                raise
+            if ok:
+                name, sink = ctx['fragment_filename_sanitized'], ctx['dl'].sink
+                size = sink.size(name) if sink is not None else None
+                limit.success(time.monotonic() - started, self.filesize_or_none(name) if size is None else size)
+            return ok
+
+    def _read_fragment(self, ctx):
+        sink, name = ctx['dl'].sink, ctx.get('fragment_filename_sanitized')
+        content = sink.pop(name) if sink is not None and name else None
+        where = "memory"
+        if content is None: content, where = super()._read_fragment(ctx), "disk"
+        if content is not None and self.ydl.metrics is not None: self.ydl.metrics.inc('fragments_total', sink=where)
+        return content
+
+
+class AdaptiveHlsFD(AdaptiveFragmentMixin, HlsFD):
+    pass
+
+
+class AdaptiveDashFD(AdaptiveFragmentMixin, DashSegmentsFD):
+    pass
+
+
+ADAPTIVE_DOWNLOADERS = {HlsFD: AdaptiveHlsFD, DashSegmentsFD: AdaptiveDashFD}
+
+
+class EngineYDL(yt_dlp.YoutubeDL):
+    """YoutubeDL that routes downloads through the engine's connection machinery.
+
+    Plain HTTP(S) formats go to PooledHttpFD, native HLS and DASH to the adaptive fragment
+    downloaders, everything else (ffmpeg cases, external downloaders) to yt-dlp's own
+    selection. `budget` is the semaphore of connections shared by every running job, and
+    retries are counted in `metrics`. With `defer_post_processing` the merge, fixups and other
+    post-processors are only collected while downloading; `finish_post_processing()` runs
+    them later, on whatever thread the caller chooses. Streams found in `archive` (a
+    DownloadArchive) are linked into place instead of downloaded, and the streams of finished
+    merges are added to it. `bandwidth(nbytes)` is called before received data is written and
+    blocks to hold the transfer to its rate caps.
+    """
+    def __init__(self, params=None, http=None, budget=None, metrics=None, defer_post_processing=False, archive=None,
+                 bandwidth=None):
+        super().__init__(params)
+        self.http = http
+        self.budget = budget
+        self.metrics = metrics
+        self.defer_post_processing = defer_post_processing
+        self.media_archive = archive     # DownloadArchive; YoutubeDL.archive is its --download-archive set
+        self.reset(bandwidth)
+
+    def reset(self, bandwidth=None):
+        """Readies the instance for its next job (it may come from a YdlPool): a fresh fragment
+        limit for the job's concurrent_fragment_downloads, its rate caps, nothing deferred."""
+        self.limit = AdaptiveLimit(self.params.get('concurrent_fragment_downloads') or 1, self.budget)
+        self.deferred = []      # (filename, info, snapshot, files_to_move) awaiting post-processing
+        self.bandwidth = bandwidth
+
+    def throttle(self, nbytes):
+        if self.bandwidth is not None and nbytes > 0: self.bandwidth(nbytes)
+
+    def count_retry(self, kind, err):
+        if self.metrics is not None: self.metrics.inc('retries_total', kind=kind, error=error_class(err))
+
+    @contextmanager
+    def connection(self):
+        if self.budget is not None: self.budget.acquire()
+        try: yield
+        finally:
+            if self.budget is not None: self.budget.release()
+
+    def _downloader_for(self, info):
+        if self.http is not None and PooledHttpFD.can_download(info, self.params): return PooledHttpFD
+        return ADAPTIVE_DOWNLOADERS.get(get_suitable_downloader(info, self.params))
+
+    def dl(self, name, info, subtitle=False, test=False):
+        if (self.media_archive is not None and not (subtitle or test) and name != '-' and info.get('format_id')
+                and not os.path.exists(name) and self.media_archive.reuse_stream(info, info['format_id'], name)):
+            # The downloader finds the file complete and reports it as already downloaded
+            if self.metrics is not None: self.metrics.inc('dedup_total', action="stream")
+        fd_class = None if test or name == '-' or not info.get('url') else self._downloader_for(info)
+        if fd_class is None: return super().dl(name, info, subtitle, test)
+        fd = fd_class(self, self.params)
+        for ph in self._progress_hooks: fd.add_progress_hook(ph)
+        new_info = self._copy_infodict(info)
+        if new_info.get('http_headers') is None: new_info['http_headers'] = self._calc_headers(new_info)
+        return fd.download(name, new_info, subtitle)
+
+    def post_process(self, filename, info, files_to_move=None):
+        if not self.defer_post_processing: return super().post_process(filename, info, files_to_move)
+        # process_info() keeps using `info` in place, so it is handed back unchanged. Its caller
+        # then pops every key shared with the parent video (id, title, ...), hence the snapshot
+        self.deferred.append((filename, info, dict(info), files_to_move))
+        return info
+
+    def finish_post_processing(self):
+        """Runs the deferred post-processors and returns the processed info dicts.
+
+        Raises PostProcessingError where process_info would have reported it.
+        """
+        done = []
+        while self.deferred:
+            filename, info, snapshot, files_to_move = self.deferred.pop(0)
+            info.update({k: v for k, v in snapshot.items() if k not in info})
+            if self.media_archive is not None:
+                # Before the merge deletes its inputs
+                for f in info.get('requested_formats') or ():
+                    if f.get('filepath'): self.media_archive.add_stream(info, f, f['filepath'])
+            info = super().post_process(filename, info, files_to_move)
+            for ph in self._post_hooks: ph(info['filepath'])
+            done.append(info)
+        return done
@@ -0,0 +1,533 @@
+import functools
+import itertools
+import os
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import nullcontext
+
+# yt-dlp (and downloaders, which subclasses its classes) is imported on first use or by
+# warm(): its import and extractor registry dominate start-up otherwise.
+from archive import link_or_copy
+from bandwidth import BandwidthShaper
+from formats import FormatCatalog, is_query
+from http_pool import HttpPool
+from infocache import InfoCache
+from metrics import Metrics
+from paths import cache_dir
+from postprocess import PostProcessQueue
+from preview import PartialFile
+from progress import ProgressBoard
+from scheduler import DownloadJob, DownloadScheduler
+from ydl_pool import YdlPool
+
+BROWSER_UA = ('Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
+              '(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36')
+
+# yt-dlp option profiles. 'referer': True means "send the page URL itself as the referer".
+PROFILES = {
+    "default": {
+        'concurrent_fragment_downloads': 12,
+        # The embedding API defaults both to 0, so one 503 would drop a fragment for good
+        'retries': 10,
+        'fragment_retries': 10,
+    },
+    "bypass": {
+        'user_agent': BROWSER_UA,
+        'referer': True,
+        'no_check_certificate': True,
+        'concurrent_fragment_downloads': 15,
+        'buffersize': 1024 * 1024,
+        'retries': 10,
+        'fragment_retries': 10,
+    },
+}
+
+
+def profile_options(profile, url=None, **extra):
+    """yt-dlp parameters for `profile`, plus `extra`; a referer profile sends `url` as the referer.
+
+    The profiles' user_agent, referer and no_check_certificate are command-line option names,
+    which the YoutubeDL API ignores; they are turned into http_headers and nocheckcertificate.
+    """
+    opts = {'quiet': True, 'noprogress': True, 'cachedir': cache_dir("yt-dlp"), **PROFILES[profile]}
+    headers = {}
+    if opts.get('user_agent'): headers['User-Agent'] = opts.pop('user_agent')
+    referer = opts.pop('referer', None)
+    if referer and url: headers['Referer'] = url if referer is True else referer
+    if opts.pop('no_check_certificate', False): opts['nocheckcertificate'] = True
+    if headers: opts['http_headers'] = headers
+    return {**opts, **extra}
+
+
+def format_eta(seconds):
+    if seconds is None: return "N/A"
+    return time.strftime('%H:%M:%S' if seconds >= 3600 else '%M:%S', time.gmtime(seconds))
+
+
+class BatchAnalysis:
+    """Handle for a running DownloadEngine.analyze_batch() call."""
+    def __init__(self):
+        self.cancelled = False
+        self.count = 0                  # entries scheduled so far
+        self.done = threading.Event()
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class Analysis:
+    """Handle for a running DownloadEngine.analyze() call.
+
+    `extracted` resolves to the info dict as soon as the extractor returns, `info` once the
+    format sizes are probed as well; both are cancelled with the analysis.
+    """
+    def __init__(self, url):
+        self.url = url
+        self.extracted = Future()
+        self.info = Future()
+        self.cancelled = False
+        self._task = None
+
+    def cancel(self):
+        """Drops the analysis: not started, it never runs; running, it stops before probing.
+
+        An extraction already under way finishes (yt-dlp can't be interrupted) and still
+        fills the info cache.
+        """
+        self.cancelled = True
+        if self._task is not None: self._task.cancel()
+        self.extracted.cancel()
+        self.info.cancel()
+
+
+class DownloadEngine:
+    """UI-independent analysis and download engine shared by the GUI, the CLI and the daemon.
+
+    Jobs run on a DownloadScheduler and report through a ProgressBoard keyed by job, so any
+    front end can observe them without the engine knowing about Tk. With a JobJournal every
+    state change and a periodic byte offset is persisted, and `restore()` picks up the jobs a
+    previous process left unfinished. Phase timings, byte and retry counters and error classes
+    go to `metrics`. Merging and other post-processing run on a separate PostProcessQueue, so a
+    job gives its download slot back as soon as its bytes are on disk. With a DownloadArchive,
+    a video already downloaded in the same format is not downloaded again. Every transfer is
+    held to the global and per-job caps of `bandwidth`, which can be changed while jobs run.
+    Extraction and downloads use warm YoutubeDL instances from a YdlPool instead of new ones.
+    """
+    def __init__(self, profile="default", max_jobs=3, max_connections=24, journal=None, metrics=None,
+                 post_workers=None, archive=None, bandwidth=None):
+        self.profile = profile
+        self.journal = journal
+        self.archive = archive
+        self.metrics = metrics or Metrics()
+        self.bandwidth = bandwidth or BandwidthShaper()
+        if self.bandwidth.metrics is None: self.bandwidth.metrics = self.metrics
+        self.info_cache = InfoCache()
+        self.http = HttpPool()
+        self.progress = ProgressBoard()
+        self.scheduler = DownloadScheduler(self._run, max_jobs=max_jobs, max_connections=max_connections)
+        self.postprocess = PostProcessQueue(post_workers)
+        self.ydls = YdlPool(profile_options, size=max_jobs, metrics=self.metrics)
+        self._download_ydl = None       # EngineYDL factory, the pool key of download instances
+        self.jobs = {}
+        self._ids = itertools.count(1)
+        self._analyses = {}             # url -> Analysis still running
+        self._analyses_lock = threading.Lock()
+        self._analysis_pool = ThreadPoolExecutor(2, thread_name_prefix="analyze")
+        self.metrics.gauge('jobs', lambda: Counter((('state', j.state),) for j in list(self.jobs.values())))
+
+    def warm(self):
+        """Imports yt-dlp and builds its extractor registry on a background thread.
+
+        Front ends call this once they are interactive, so the first analysis doesn't pay for it.
+        """
+        def run():
+            with self.metrics.phase('warm'):
+                self.ydls.warm(self.profile)
+                self.ydls.warm(self.profile, self.download_ydl())
+        threading.Thread(target=run, name="warm", daemon=True).start()
+
+    def options(self, url=None, **extra):
+        return profile_options(self.profile, url, **extra)
+
+    def download_ydl(self):
+        """Factory of the EngineYDL instances jobs download with (imports yt-dlp)."""
+        if self._download_ydl is None:
+            from downloaders import EngineYDL
+            self._download_ydl = functools.partial(EngineYDL, http=self.http, budget=self.scheduler.connections,
+                                                   metrics=self.metrics, defer_post_processing=True, archive=self.archive)
+        return self._download_ydl
+
+    def http_headers(self):
+        """Headers for side requests (thumbnails, probes) made on behalf of this profile."""
+        ua = PROFILES[self.profile].get('user_agent')
+        return {'User-Agent': ua} if ua else {}
+
+    # --- ANALYSIS ---
+    def extract(self, url, ydl=None):
+        """Returns the info dict for `url`, running the extractor only on a cache miss."""
+        info = self.info_cache.get(url)
+        self.metrics.inc('info_cache_total', result="miss" if info is None else "hit")
+        if info is not None: return info
+        with self.metrics.phase('extract', url=url), \
+                (self.ydls.lease(self.profile, self.options(url, noplaylist=True)) if ydl is None else nullcontext(ydl)) as ydl:
+            info = ydl.sanitize_info(ydl.extract_info(url, download=False), remove_private_keys=True)
+        self.info_cache.put(url, info)
+        return info
+
+    def analyze(self, url):
+        """Extracts and probes `url` in the background and returns its Analysis.
+
+        Asking again for a URL whose analysis is still running joins it, so a speculative
+        analysis started on paste is picked up by the explicit one instead of repeated.
+        """
+        with self._analyses_lock:
+            analysis = self._analyses.get(url)
+            if analysis is not None and not analysis.cancelled: return analysis
+            analysis = self._analyses[url] = Analysis(url)
+            analysis._task = self._analysis_pool.submit(self._analyze, analysis)
+        return analysis
+
+    def _analyze(self, analysis):
+        try:
+            if analysis.cancelled: return
+            info = self.extract(analysis.url)
+            if analysis.cancelled or not analysis.extracted.set_running_or_notify_cancel(): return
+            analysis.extracted.set_result(info)
+            info = self.probe_sizes(analysis.url, info)
+            if analysis.info.set_running_or_notify_cancel(): analysis.info.set_result(info)
+        except Exception as e:      # counted under the extract or probe phase
+            for future in (analysis.extracted, analysis.info):
+                if not future.done() and future.set_running_or_notify_cancel(): future.set_exception(e)
+        finally:
+            with self._analyses_lock:
+                if self._analyses.get(analysis.url) is analysis: del self._analyses[analysis.url]
+
+    def analyze_batch(self, sources, on_result, on_error=None, on_done=None, workers=4):
+        """Analyzes a list of URLs, expanding playlists and channels, with `workers` extractions at once.
+
+        Playlists are flat-extracted first and their pages consumed lazily, so full format
+        extraction of the first entries starts before the rest of the listing is known.
+        `on_result(index, url, info)` and `on_error(index, url, exc)` are called from worker
+        threads as soon as each entry finishes, and `on_done()` once everything has.
+        """
+        batch = BatchAnalysis()
+        pool = ThreadPoolExecutor(workers, thread_name_prefix="analyze")
+        slots = threading.BoundedSemaphore(workers * 2)   # keeps the playlist listing lazy
+
+        def run(index, url, extract):
+            try:
+                if batch.cancelled: return
+                info = extract()
+                if not batch.cancelled: on_result(index, url, info)
+            except Exception as e:
+                if on_error and not batch.cancelled: on_error(index, url, e)
+            finally:
+                slots.release()
+
+        def schedule(url, extract):
+            slots.acquire()
+            pool.submit(run, batch.count, url, extract)
+            batch.count += 1
+
+        def feed():
+            try:
+                for source in sources:
+                    if batch.cancelled: break
+                    if self.info_cache.get(source) is not None:
+                        schedule(source, lambda s=source: self.extract(s))
+                        continue
+                    opts = self.options(source, noplaylist=False, extract_flat='in_playlist', lazy_playlist=True)
+                    try:
+                        with self.ydls.lease(self.profile, opts) as ydl:
+                            flat = ydl.extract_info(source, download=False, process=False)
+                            if flat.get('_type') not in ('playlist', 'multi_video'):
+                                # A single video: finish processing it here instead of extracting twice
+                                info = ydl.sanitize_info(ydl.process_ie_result(flat, download=False), remove_private_keys=True)
+                                self.info_cache.put(source, info)
+                                schedule(source, lambda i=info: i)
+                                continue
+                            for entry in flat.get('entries') or ():
+                                if batch.cancelled: break
+                                if not entry: continue
+                                if entry.get('_type', 'video') in ('url', 'url_transparent'):
+                                    schedule(entry['url'], lambda u=entry['url']: self.extract(u))
+                                else:
+                                    # Entry already fully extracted as part of the playlist page
+                                    info = ydl.sanitize_info(ydl.process_ie_result(entry, download=False), remove_private_keys=True)
+                                    schedule(info.get('webpage_url') or source, lambda i=info: i)
+                    except Exception as e:
+                        self.metrics.error('analyze', e, url=source)
+                        if on_error: on_error(batch.count, source, e)
+            finally:
+                # Entries still queued when the batch was cancelled are dropped unrun
+                pool.shutdown(wait=True, cancel_futures=batch.cancelled)
+                batch.done.set()
+                if on_done: on_done()
+
+        threading.Thread(target=feed, name="analyze-feed", daemon=True).start()
+        return batch
+
+    def probe_sizes(self, url, info, workers=4):
+        """Fills in `filesize` for direct HTTP formats the extractor left unsized.
+
+        Each probe is a HEAD (or one-byte GET) over the pooled connection to the format's
+        host; the sized info dict is written back to the info cache. Formats that can't be
+        probed this way are sized from their bitrate by FormatCatalog.
+        """
+        missing = [f for f in info.get('formats', []) if not (f.get('filesize') or f.get('filesize_approx'))
+                   and f.get('protocol') in ('http', 'https')]
+        if not missing: return info
+        verify = not self.options(url).get('nocheckcertificate')
+
+        def probe(f):
+            f['filesize'] = self.http.probe_size(f['url'], {**self.http_headers(), **(f.get('http_headers') or {})}, verify)
+
+        with self.metrics.phase('probe', url=url, formats=len(missing)), \
+                ThreadPoolExecutor(min(workers, len(missing)), thread_name_prefix="probe") as pool:
+            list(pool.map(probe, missing))
+        self.info_cache.put(url, info)
+        return info
+
+    @staticmethod
+    def catalog(info):
+        return FormatCatalog(info)
+
+    def resolve_format(self, url, spec):
+        """Turns a FormatCatalog query (e.g. "best:size<=500M") into a format id; others pass through."""
+        if not is_query(spec): return spec
+        chosen = self.catalog(self.probe_sizes(url, self.extract(url))).select(spec)
+        if chosen is None: raise ValueError(f"no format matches {spec!r}")
+        return chosen.format_id
+
+    # --- JOBS ---
+    @staticmethod
+    def outtmpl(job):
+        return os.path.join(job.path, f"{job.name}.%(ext)s")
+
+    def _new_job(self, url, format_id, path, name, priority=0, task=None):
+        fragments = PROFILES[self.profile].get('concurrent_fragment_downloads', 12)
+        return DownloadJob(url, format_id, path, name, priority=priority, fragments=fragments, task=task)
+
+    def submit(self, url, format_id, path, name, priority=0, task=None, rate=None):
+        """Queues a download; `rate` caps it in bytes per second."""
+        job = self._new_job(url, format_id, path, name, priority, task)
+        if rate: self.bandwidth.set_job_rate(job, rate)
+        job.id = self.journal.add(job, self.outtmpl(job), self.profile) if self.journal else next(self._ids)
+        self.jobs[job.id] = job
+        self.progress.set_status(job, "queued")
+        return self.scheduler.submit(job)
+
+    def _from_archive(self, job):
+        """Completes `job` without downloading when the archive has this video in this format.
+
+        Only analyzed URLs are checked (the video id comes from the info cache), and only for
+        extractors with stable ids (see DownloadArchive). A file already at the target is kept,
+        anywhere else it is hardlinked (or copied) to the target. Runs on the job's worker,
+        since linking may fall back to a full copy.
+        """
+        info = self.info_cache.get(job.url) if self.archive is not None else None
+        if not info: return False
+        # A format with its own audio is the whole file, so its stated size must match
+        fmt = next((f for f in info.get('formats') or () if f.get('format_id') == job.format_id), None)
+        existing = self.archive.find(info, job.format_id, expect=fmt if fmt and fmt.get('acodec') != 'none' else None)
+        if not existing: return False
+        with self.ydls.lease(self.profile) as ydl:
+            target = ydl.prepare_filename({**info, 'ext': os.path.splitext(existing)[1][1:]}, outtmpl=self.outtmpl(job))
+        if os.path.exists(target) and os.path.samefile(existing, target):
+            action = "skip"
+        elif os.path.exists(target):
+            return False    # a different file is in the way; let yt-dlp decide
+        else:
+            link_or_copy(existing, target)
+            self.archive.add_file(info, job.format_id, target)
+            action = "link"
+        size = os.path.getsize(target)
+        job.state = "done"
+        self.progress.publish(job, "finished", size, size)
+        self._track(job, filename=target)
+        self.metrics.inc('dedup_total', action=action)
+        return True
+
+    def restore(self, bind=None):
+        """Re-creates the jobs a previous process left unfinished in the journal.
+
+        `bind(job)` runs before a job is queued (the GUI attaches its card there). Paused jobs
+        stay paused; everything else is queued again and continues from its partial files.
+        """
+        if self.journal is None: return []
+        restored = []
+        for row in self.journal.unfinished(self.profile):
+            job = self._new_job(row['url'], row['format_id'], row['path'], row['name'], row['priority'])
+            job.id = row['id']
+            self.jobs[job.id] = job
+            self.progress.publish(job, "queued", row['downloaded'], row['total'])
+            if row['state'] == "paused": job.paused, job.state = True, "paused"
+            if bind: bind(job)
+            if job.paused:
+                self.progress.set_status(job, "paused")
+            else:
+                self.scheduler.submit(job)
+                self._track(job)
+            restored.append(job)
+        return restored
+
+    def pause(self, job):
+        self.scheduler.pause(job)
+        if job.state == "paused":
+            self.progress.set_status(job, "paused")
+            self._track(job)
+
+    def resume(self, job):
+        self.scheduler.resume(job)
+        self._track(job)
+
+    def cancel(self, job):
+        """Returns True if the job was dropped right away (it was queued or paused)."""
+        if self.scheduler.cancel(job):
+            self.progress.set_status(job, "cancelled")
+            self.bandwidth.forget(job)
+            self._track(job)
+            return True
+        return False
+
+    def bump(self, job):
+        if not self.scheduler.bump(job): return False
+        self._track(job)
+        return True
+
+    def _track(self, job, **fields):
+        if self.journal: self.journal.update(job.id, state=job.state, priority=job.priority, error=job.error, **fields)
+
+    def describe(self, job):
+        p = self.progress.get(job)
+        return {
+            'id': job.id, 'url': job.url, 'format_id': job.format_id, 'path': job.path, 'name': job.name,
+            'priority': job.priority, 'state': job.state, 'error': job.error,
+            'downloaded': p.downloaded if p else 0, 'total': p.total if p else None,
+            'speed': p.speed if p else None, 'eta': p.eta if p else None,
+            'rate': self.bandwidth.job_rate(job),
+        }
+
+    # --- WORKER ---
+    def _run(self, job):
+        from downloaders import CancelDownload, DownloadError, PauseDownload
+        self.progress.set_status(job, "starting")
+        self._track(job)
+        if job.partial is None: job.partial = PartialFile()
+        synced = [0.0]
+        started = time.perf_counter()
+        marks = {'first_byte': None}
+        received, received_lock = {}, threading.Lock()
+        ydl, handed_off = None, False
+
+        def count_bytes(d):
+            # Hooks report running totals per file; count the growth since the last report
+            key, now = d.get('filename'), d.get('downloaded_bytes') or 0
+            with received_lock:
+                prev = received.get(key, 0)
+                received[key] = max(now, prev)
+            if now > prev: self.metrics.inc('download_bytes_total', now - prev)
+
+        def progress_hook(d):
+            # Pause and cancel both tear the transfer down; a paused job resumes from its
+            # .part file (or .ytdl fragment index) when it is picked up again
+            if job.cancelled: raise CancelDownload()
+            if job.paused: raise PauseDownload()
+
+            count_bytes(d)
+            job.partial.update(d)
+            if d['status'] == 'downloading':
+                downloaded, total = d.get('downloaded_bytes') or 0, d.get('total_bytes') or d.get('total_bytes_estimate')
+                if marks['first_byte'] is None and downloaded:
+                    marks['first_byte'] = time.perf_counter()
+                    self.metrics.record_phase('first_byte', marks['first_byte'] - started, job=job.id)
+                self.progress.publish(job, "downloading", downloaded, total, d.get('speed'), d.get('eta'))
+                if self.journal and time.monotonic() - synced[0] >= 2:
+                    synced[0] = time.monotonic()
+                    self.journal.update(job.id, downloaded=downloaded, total=total,
+                                        filename=d.get('tmpfilename') or d.get('filename'))
+            elif d['status'] == 'finished':
+                # One file is complete; the job is only finished once merged (see _post_process)
+                self.progress.publish(job, "downloading", d.get('downloaded_bytes') or 0, d.get('total_bytes'))
+
+        try:
+            if is_query(job.format_id):
+                # Resolved once; a resumed job keeps the format it started with
+                job.format_id = self.resolve_format(job.url, job.format_id)
+                self._track(job, format_id=job.format_id)
+            if self._from_archive(job): return
+            opts = self.options(job.url, **{
+                'format': f'{job.format_id}+bestaudio/best',
+                'noplaylist': True,         # as in extract(): a watch?v=…&list=… URL is the one video
+                'outtmpl': self.outtmpl(job),
+                'progress_hooks': [progress_hook],
+                'concurrent_fragment_downloads': self.scheduler.fragments_for(job),
+                'continuedl': True,
+            })
+            # A warm instance from the pool; it goes back once the job is done with it (after merging)
+            ydl = self.ydls.acquire(self.profile, opts, self.download_ydl())
+            ydl.reset(bandwidth=functools.partial(self.bandwidth.consume, job))
+            # Re-run format selection and download on the analyzed info dict
+            cached = self.info_cache.get(job.url)
+            try:
+                ydl.process_ie_result(cached or self.extract(job.url, ydl), download=True)
+            except DownloadError:
+                if cached is None: raise
+                # Cached stream URLs may have expired; extract once more and retry
+                self.info_cache.invalidate(job.url)
+                ydl.process_ie_result(self.extract(job.url, ydl), download=True)
+            self.metrics.record_phase('download', time.perf_counter() - started, job=job.id)
+            if ydl.deferred:
+                # Bytes are on disk: free the download slot and let the post-processing pool merge
+                job.state, handed_off = "processing", True
+                self.progress.set_status(job, "processing")
+                self.postprocess.submit(self._post_process, job, ydl, started)
+            else:
+                job.state = "done"
+                self.progress.set_status(job, "finished")
+        except PauseDownload:
+            self.scheduler.park(job)
+            self.progress.set_status(job, job.state)
+        except CancelDownload:
+            job.state = "cancelled"
+            self.progress.set_status(job, "cancelled")
+        except Exception as e:
+            job.state = "cancelled" if job.cancelled else "error"
+            job.error = str(e)
+            self.progress.set_status(job, job.state)
+            if job.state == "error": self.metrics.record_phase('download', time.perf_counter() - started, e, job=job.id)
+        finally:
+            self._track(job)
+            # Once handed to the post-processing pool, the job (and its state) is finished there
+            if not handed_off:
+                if job.state != "paused": job.partial.finish()
+                if ydl is not None: self.ydls.release(ydl, discard=job.state != "done")
+                self._settled(job, started)
+
+    def _post_process(self, job, ydl, started):
+        try:
+            with self.metrics.phase('merge', job=job.id):
+                processed = ydl.finish_post_processing()
+            if processed: job.partial.output = processed[-1].get('filepath')
+            if self.archive is not None:
+                for info in processed:
+                    if self.archive.add_file(info, job.format_id, info['filepath']): self.metrics.inc('dedup_total', action="hash")
+            job.state = "done"
+            self.progress.set_status(job, "finished")
+        except Exception as e:
+            job.state, job.error = "error", str(e)
+            self.progress.set_status(job, "error")
+        finally:
+            job.partial.finish()
+            self.ydls.release(ydl, discard=job.state != "done")
+            self._track(job)
+            self._settled(job, started)
+            job.done.set()
+
+    def _settled(self, job, started):
+        if job.state != "paused": self.bandwidth.forget(job)
+        self.metrics.inc('jobs_total', outcome=job.state)
+        self.metrics.trace('job', job=job.id, url=job.url, state=job.state, error=job.error,
+                           seconds=round(time.perf_counter() - started, 6))
@@ -0,0 +1,192 @@
+import bisect
+import re
+
+# Codec string prefixes (as in RFC 6381 / yt-dlp) -> family names used in queries
+CODEC_FAMILIES = (
+    ('av01', 'av1'), ('av1', 'av1'), ('vp09', 'vp9'), ('vp9', 'vp9'), ('vp8', 'vp8'),
+    ('hvc1', 'hevc'), ('hev1', 'hevc'), ('h265', 'hevc'), ('hevc', 'hevc'), ('avc', 'h264'), ('h264', 'h264'),
+    ('opus', 'opus'), ('mp4a', 'aac'), ('aac', 'aac'), ('vorbis', 'vorbis'), ('mp3', 'mp3'),
+    ('ac-3', 'ac3'), ('ec-3', 'eac3'), ('flac', 'flac'),
+)
+ORDERS = ("best", "smallest")
+
+
+def codec_family(codec):
+    if not codec or codec == 'none': return None
+    codec = codec.lower()
+    for prefix, family in CODEC_FAMILIES:
+        if codec.startswith(prefix): return family
+    return codec.split('.')[0]
+
+
+def format_bytes(size):
+    if not size: return "N/A"
+    for unit in ['', 'K', 'M', 'G', 'T']:
+        if size < 1024: return f"{size:.1f}{unit}B"
+        size /= 1024
+    return f"{size:.1f}PB"
+
+
+def parse_size(text):
+    """'500M', '1.5GB', '700MiB' -> bytes."""
+    m = re.fullmatch(r"(\d+(?:\.\d+)?)\s*([kmgt]?)(?:i?b)?", str(text).strip().lower())
+    if not m: raise ValueError(f"invalid size {text!r}")
+    return int(float(m.group(1)) * 1024 ** " kmgt".index(m.group(2) or " "))
+
+
+class Format:
+    """One downloadable format, reduced to what selection needs.
+
+    `size` is exact when the extractor or a probe knew the byte count (`exact`), otherwise
+    estimated from the bitrate and duration, or None.
+    """
+    __slots__ = ('format_id', 'kind', 'height', 'fps', 'vcodec', 'acodec', 'tbr', 'ext', 'protocol', 'size', 'exact')
+
+    def __init__(self, format_id, kind, height=None, fps=None, vcodec=None, acodec=None, tbr=None, ext=None,
+                 protocol=None, size=None, exact=False):
+        self.format_id = format_id
+        self.kind = kind            # video (no audio) | audio (no video) | muxed
+        self.height = height
+        self.fps = fps
+        self.vcodec = vcodec        # codec family, see CODEC_FAMILIES
+        self.acodec = acodec
+        self.tbr = tbr              # kbit/s
+        self.ext = ext
+        self.protocol = protocol
+        self.size = size
+        self.exact = exact
+
+    @classmethod
+    def from_info(cls, f, duration=None):
+        # A codec the extractor didn't name is assumed present unless yt-dlp knows the stream is missing
+        vcodec = codec_family(f.get('vcodec')) if f.get('vcodec') or f.get('video_ext') == 'none' else "unknown"
+        acodec = codec_family(f.get('acodec')) if f.get('acodec') or f.get('audio_ext') == 'none' else "unknown"
+        kind = "audio" if vcodec is None else "video" if acodec is None else "muxed"
+        tbr = f.get('tbr') or (f.get('vbr') or 0) + (f.get('abr') or 0) or None
+        size, exact = f.get('filesize'), True
+        if not size:
+            size, exact = f.get('filesize_approx'), False
+        if not size and tbr and duration: size = int(tbr * 125 * duration)
+        return cls(str(f['format_id']), kind, f.get('height'), f.get('fps'), vcodec, acodec, tbr, f.get('ext'),
+                   f.get('protocol'), int(size) if size else None, bool(size) and exact)
+
+    def quality(self):
+        return (self.height or 0, self.fps or 0, self.tbr or 0)
+
+    def label(self, total=None):
+        size = total if total is not None else self.size
+        shown = f"{'' if self.exact else '~'}{format_bytes(size)}" if size else "size unknown"
+        if self.kind == "audio":
+            head = f"Audio {self.acodec or ''} {round(self.tbr)}k" if self.tbr else f"Audio {self.acodec or ''}"
+        else:
+            head = f"{self.height}p{self.fps if self.fps and self.fps > 30 else ''}" if self.height else "Video"
+            if self.vcodec and self.vcodec != "unknown": head += f" {self.vcodec.upper()}"
+        return f"{head} · {self.ext} · {shown}  [{self.format_id}]"
+
+    def as_dict(self):
+        return {k: getattr(self, k) for k in self.__slots__}
+
+
+class FormatCatalog:
+    """The formats of one analyzed video, indexed for selection.
+
+    Indexes by height, video and audio codec family, container and total size (a video-only
+    format counts with the best audio it is merged with), so queries such as "best under
+    500 MB" or "smallest at least 720p in AV1 or VP9" don't scan every format. `select()`
+    takes the same queries as text: ``best:size<=500M`` or ``smallest:height>=720,vcodec=av1|vp9``.
+    """
+    def __init__(self, info):
+        duration = info.get('duration')
+        self.formats = [Format.from_info(f, duration) for f in info.get('formats') or ()
+                        if f.get('format_id') and f.get('ext') != 'mhtml']   # mhtml: storyboard images
+        self.best_audio = max((f for f in self.formats if f.kind == "audio"), key=Format.quality, default=None)
+        self.by_id = {f.format_id: f for f in self.formats}
+        self.by_height, self.by_codec, self.by_ext = {}, {}, {}
+        for f in self.formats:
+            self.by_height.setdefault(f.height or 0, []).append(f)
+            for codec in {f.vcodec, f.acodec} - {None}: self.by_codec.setdefault(codec, []).append(f)
+            self.by_ext.setdefault(f.ext, []).append(f)
+        self._heights = sorted(self.by_height)
+        sized = sorted(((s, i) for i, f in enumerate(self.formats) if (s := self.total_size(f)) is not None))
+        self._sizes = [s for s, _ in sized]
+        self._by_size = [self.formats[i] for _, i in sized]
+
+    def total_size(self, f):
+        """Bytes on disk once downloaded: a video-only format is merged with the best audio."""
+        if f.size is None: return None
+        if f.kind == "video" and self.best_audio is not None:
+            return f.size + self.best_audio.size if self.best_audio.size else None
+        return f.size
+
+    # --- QUERIES ---
+    def query(self, kind="video", min_size=None, max_size=None, min_height=None, max_height=None, min_fps=None,
+              codecs=None, acodecs=None, exts=None):
+        """Formats matching every given bound, in no particular order.
+
+        kind: "video" (anything with video), "audio" (audio only) or None. codecs, acodecs and
+        exts are collections of families and containers, any of which may match.
+        """
+        candidates = None
+
+        def narrow(found):
+            nonlocal candidates
+            found = {id(f): f for f in found}
+            candidates = found if candidates is None else {k: f for k, f in candidates.items() if k in found}
+
+        if min_size is not None or max_size is not None:
+            lo = bisect.bisect_left(self._sizes, min_size) if min_size is not None else 0
+            hi = bisect.bisect_right(self._sizes, max_size) if max_size is not None else len(self._sizes)
+            narrow(self._by_size[lo:hi])
+        if min_height is not None or max_height is not None:
+            lo = bisect.bisect_left(self._heights, min_height) if min_height is not None else 0
+            hi = bisect.bisect_right(self._heights, max_height) if max_height is not None else len(self._heights)
+            narrow(f for h in self._heights[lo:hi] for f in self.by_height[h])
+        if codecs: narrow(f for c in codecs for f in self.by_codec.get(c, ()) if f.vcodec == c)
+        if acodecs: narrow(f for c in acodecs for f in self.by_codec.get(c, ()) if f.acodec == c)
+        if exts: narrow(f for e in exts for f in self.by_ext.get(e, ()))
+        found = self.formats if candidates is None else candidates.values()
+        return [f for f in found if (kind is None or (f.kind == "audio") == (kind == "audio"))
+                and (min_fps is None or (f.fps or 0) >= min_fps)]
+
+    def best(self, **bounds):
+        return max(self.query(**bounds), key=Format.quality, default=None)
+
+    def smallest(self, **bounds):
+        return min((f for f in self.query(**bounds) if self.total_size(f) is not None),
+                   key=self.total_size, default=None)
+
+    def select(self, spec):
+        """Resolves a text query (see the class docstring) to a Format, or None."""
+        order, _, filters = spec.partition(":")
+        if order not in ORDERS: raise ValueError(f"format query must start with {' or '.join(ORDERS)}: {spec!r}")
+        return getattr(self, order)(**parse_query(filters))
+
+    def choices(self):
+        """(label, Format) pairs for a picker, worst to best: audio-only first, then video."""
+        ordered = sorted(self.formats, key=lambda f: (f.kind != "audio", f.quality()))
+        return [(f.label(self.total_size(f)), f) for f in ordered]
+
+
+def is_query(spec):
+    return isinstance(spec, str) and spec.partition(":")[0] in ORDERS and ":" in spec
+
+
+def parse_query(filters):
+    """'size<=500M,height>=720,vcodec=av1|vp9' -> FormatCatalog.query() keyword arguments."""
+    bounds = {}
+    for item in filter(None, (part.strip() for part in filters.split(","))):
+        m = re.fullmatch(r"(\w+)\s*(<=|>=|=)\s*(.+)", item)
+        if not m: raise ValueError(f"invalid format filter {item!r}")
+        key, op, value = m.groups()
+        if key in ("size", "height") or key == "fps" and op == ">=":
+            number = parse_size(value) if key == "size" else int(value)
+            if op in ("<=", "="): bounds[f"max_{key}"] = number
+            if op in (">=", "="): bounds[f"min_{key}"] = number
+        elif key == "kind" and op == "=" and value in ("video", "audio", "any"):
+            bounds['kind'] = None if value == "any" else value
+        elif key in ("vcodec", "acodec", "ext") and op == "=":
+            values = [v.strip().lower() for v in value.split("|")]
+            bounds[{'vcodec': 'codecs', 'acodec': 'acodecs', 'ext': 'exts'}[key]] = values
+        else:
+            raise ValueError(f"unsupported format filter {item!r}")
+    return bounds
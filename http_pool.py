@@ -0,0 +1,180 @@
+import threading
+from collections import OrderedDict
+from urllib.parse import urlsplit
+
+# Set by _load() when the first session is created; importing curl_cffi costs ~135 ms
+http_lib = CurlInfo = CurlOpt = CURL_WRITEFUNC_ERROR = HTTPAdapter = None
+_loaded = False
+_load_lock = threading.Lock()
+
+
+def _load():
+    global http_lib, CurlInfo, CurlOpt, CURL_WRITEFUNC_ERROR, HTTPAdapter, RequestError, _loaded
+    with _load_lock:
+        if _loaded: return
+        try:
+            from curl_cffi import requests as http_lib
+            from curl_cffi.const import CurlInfo, CurlOpt
+            from curl_cffi.curl import CURL_WRITEFUNC_ERROR
+        except ImportError:     # plain HTTP/1.1 keep-alive through requests/urllib3
+            import requests as http_lib
+            from requests.adapters import HTTPAdapter
+        RequestError = http_lib.exceptions.RequestException
+        _loaded = True
+
+
+def __getattr__(name):
+    # RequestError is the base exception of whichever library _load() picks
+    if name != "RequestError": raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    _load()
+    return RequestError
+
+
+class RangeIgnored(Exception):
+    """The server answered a ranged request with the whole body (200 instead of 206)."""
+
+
+class _Host:
+    def __init__(self, per_host, timeout):
+        _load()
+        if CurlInfo is not None:
+            # One libcurl handle per thread; each keeps its connections (HTTP/2 when the
+            # server offers it) alive between requests. `timeout` caps whole buffered requests;
+            # streamed bodies are only aborted when they stall for that long.
+            self.session = http_lib.Session(timeout=timeout, curl_options={
+                CurlOpt.CONNECTTIMEOUT_MS: timeout * 1000,
+                CurlOpt.LOW_SPEED_LIMIT: 1,
+                CurlOpt.LOW_SPEED_TIME: timeout,
+            })
+        else:
+            self.session = http_lib.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=per_host)
+            self.session.mount("http://", adapter)
+            self.session.mount("https://", adapter)
+        self.slots = threading.BoundedSemaphore(per_host)
+        self.active = 0
+
+
+class HttpPool:
+    """Keep-alive HTTP sessions shared by thumbnails, size probes and direct downloads.
+
+    Sessions are kept per scheme+host, so repeat requests to the same CDN skip the TCP and
+    TLS handshakes. At most `per_host` requests run against one host at a time, and the least
+    recently used idle hosts are closed once more than `max_hosts` are open.
+    """
+    def __init__(self, max_hosts=16, per_host=8, timeout=20):
+        self.max_hosts = max_hosts
+        self.per_host = per_host
+        self.timeout = timeout
+        self._hosts = OrderedDict()     # "scheme://netloc" -> _Host
+        self._lock = threading.Lock()
+
+    def _acquire(self, url):
+        parts = urlsplit(url)
+        key = f"{parts.scheme}://{parts.netloc}"
+        with self._lock:
+            host = self._hosts.get(key)
+            if host is None:
+                host = self._hosts[key] = _Host(self.per_host, self.timeout)
+                for old_key, old in list(self._hosts.items()):
+                    if len(self._hosts) <= self.max_hosts: break
+                    if old.active: continue
+                    del self._hosts[old_key]
+                    old.session.close()
+            self._hosts.move_to_end(key)
+            host.active += 1
+        host.slots.acquire()
+        return host
+
+    def _release(self, host):
+        host.slots.release()
+        with self._lock:
+            host.active -= 1
+
+    def request(self, method, url, headers=None, verify=True):
+        """Buffered request; returns the response with its whole body read."""
+        host = self._acquire(url)
+        try:
+            if CurlInfo is not None:
+                return host.session.request(method, url, headers=headers, verify=verify)
+            return host.session.request(method, url, headers=headers, verify=verify, timeout=self.timeout)
+        finally:
+            self._release(host)
+
+    def get(self, url, headers=None, verify=True):
+        resp = self.request("GET", url, headers, verify)
+        resp.raise_for_status()
+        return resp
+
+    def stream(self, url, write, headers=None, verify=True):
+        """GETs `url`, handing each body chunk of a 2xx response to `write(chunk)`.
+
+        The body is consumed on the calling thread over the pooled connection and is never
+        content-decoded, so byte offsets match the file. An exception raised by `write` aborts
+        the transfer and propagates. Returns the response (headers and status); error
+        responses, and full answers to a Range request (RangeIgnored), raise without anything
+        being written.
+        """
+        ranged = "Range" in (headers or {})
+        host = self._acquire(url)
+        try:
+            if CurlInfo is None:
+                headers = {"Accept-Encoding": "identity", **(headers or {})}
+                with host.session.get(url, headers=headers, verify=verify, timeout=self.timeout, stream=True) as resp:
+                    resp.raise_for_status()
+                    if ranged and resp.status_code == 200: raise RangeIgnored(url)
+                    for chunk in resp.iter_content(64 * 1024):
+                        write(chunk)
+                return resp
+
+            failure = []
+
+            def on_chunk(chunk):
+                if failure: return CURL_WRITEFUNC_ERROR
+                try:
+                    # Error bodies are dropped; raise_for_status reports them after the transfer
+                    status = host.session.curl.getinfo(CurlInfo.RESPONSE_CODE)
+                    if ranged and status == 200: raise RangeIgnored(url)
+                    if status < 300: write(chunk)
+                except BaseException as e:
+                    failure.append(e)
+                    return CURL_WRITEFUNC_ERROR
+                return len(chunk)
+
+            try:
+                resp = host.session.get(url, headers=headers, verify=verify, timeout=None, accept_encoding=None,
+                                        content_callback=on_chunk)
+            except RequestError:
+                if failure: raise failure[0]
+                raise
+            resp.raise_for_status()
+            return resp
+        finally:
+            self._release(host)
+
+    def probe(self, url, headers=None, verify=True):
+        """(content length or None, whether the server honours byte ranges) without downloading."""
+        headers = {**(headers or {}), "Accept-Encoding": "identity"}
+        size = None
+        try:
+            resp = self.request("HEAD", url, headers, verify)
+            if resp.status_code < 300 and resp.headers.get("Content-Length"):
+                size = int(resp.headers["Content-Length"])
+                if resp.headers.get("Accept-Ranges", "").lower() == "bytes": return size, True
+            # Some CDNs refuse HEAD or don't advertise ranges; a one-byte range answers both
+            resp = self.stream(url, lambda chunk: None, {**headers, "Range": "bytes=0-0"}, verify)
+            content_range = resp.headers.get("Content-Range") or ""
+            if "/" in content_range and not content_range.endswith("*"):
+                return int(content_range.rsplit("/", 1)[1]), True
+        except (RangeIgnored, RequestError, ValueError):
+            pass
+        return size, False
+
+    def probe_size(self, url, headers=None, verify=True):
+        """Content length of `url` without downloading it, or None if the server won't say."""
+        return self.probe(url, headers, verify)[0]
+
+    def close(self):
+        with self._lock:
+            hosts, self._hosts = list(self._hosts.values()), OrderedDict()
+        for host in hosts: host.session.close()
@@ -0,0 +1,92 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import zlib
+
+from paths import cache_dir
+
+
+class InfoCache:
+    """URL -> extracted info dict cache stored as zlib-compressed JSON files.
+
+    Each entry's mtime is its creation time and its atime its last use, so the index can be
+    rebuilt from a directory scan. Entries expire after `ttl` seconds because the stream
+    URLs inside an info dict are short-lived, and the least recently used entries are
+    evicted once the files grow past `max_bytes`.
+    """
+    def __init__(self, directory=None, ttl=1800, max_bytes=64 * 2**20):
+        self.directory = directory or cache_dir("info")
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._index = {}   # key -> [created, last_used, size]
+        self._lock = threading.Lock()
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".info"):
+                st = entry.stat()
+                self._index[entry.name[:-5]] = [st.st_mtime, st.st_atime, st.st_size]
+
+    @staticmethod
+    def key(url):
+        return hashlib.sha1(url.strip().encode()).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + ".info")
+
+    def get(self, url):
+        """Returns a fresh copy of the cached info dict, or None on a miss or expired entry."""
+        key, now = self.key(url), time.time()
+        with self._lock:
+            meta = self._index.get(key)
+            if meta is None:
+                try: st = os.stat(self._path(key))   # written by another process
+                except OSError: return None
+                meta = self._index[key] = [st.st_mtime, st.st_atime, st.st_size]
+            if now - meta[0] > self.ttl:
+                self._drop(key)
+                return None
+            try:
+                with open(self._path(key), "rb") as f: blob = f.read()
+                os.utime(self._path(key), (now, meta[0]))
+            except OSError:
+                self._index.pop(key, None)
+                return None
+            meta[1] = now
+        try:
+            return json.loads(zlib.decompress(blob))
+        except (zlib.error, ValueError):
+            self.invalidate(url)
+            return None
+
+    def put(self, url, info):
+        """Stores a JSON-serializable info dict (see YoutubeDL.sanitize_info)."""
+        key, now = self.key(url), time.time()
+        blob = zlib.compress(json.dumps(info, separators=(",", ":")).encode(), 6)
+        path = self._path(key)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f: f.write(blob)
+        os.replace(tmp, path)
+        os.utime(path, (now, now))
+        with self._lock:
+            self._index[key] = [now, now, len(blob)]
+            self._evict(now)
+
+    def invalidate(self, url):
+        with self._lock:
+            self._drop(self.key(url))
+
+    def _drop(self, key):
+        self._index.pop(key, None)
+        try: os.remove(self._path(key))
+        except OSError: pass
+
+    def _evict(self, now):
+        for key in [k for k, m in self._index.items() if now - m[0] > self.ttl]:
+            self._drop(key)
+        total = sum(m[2] for m in self._index.values())
+        if total <= self.max_bytes: return
+        for key in sorted(self._index, key=lambda k: self._index[k][1]):
+            total -= self._index[key][2]
+            self._drop(key)
+            if total <= self.max_bytes: break
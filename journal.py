@@ -0,0 +1,85 @@
+import os
+import sqlite3
+import threading
+import time
+
+from paths import data_dir
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id         INTEGER PRIMARY KEY,
+    url        TEXT NOT NULL,
+    format_id  TEXT NOT NULL,
+    path       TEXT NOT NULL,
+    name       TEXT NOT NULL,
+    outtmpl    TEXT NOT NULL,
+    profile    TEXT NOT NULL,
+    priority   INTEGER NOT NULL DEFAULT 0,
+    state      TEXT NOT NULL,
+    downloaded INTEGER NOT NULL DEFAULT 0,
+    total      INTEGER,
+    filename   TEXT,
+    error      TEXT,
+    created    REAL NOT NULL,
+    updated    REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state);
+"""
+
+FINISHED_STATES = ("done", "error", "cancelled")
+
+
+class JobJournal:
+    """Crash-safe record of every job in an SQLite database running in WAL mode.
+
+    Each state change is one small committed write, so a crash loses at most the last
+    progress sample. Finished jobs are pruned and the WAL truncated when the journal opens.
+    """
+    def __init__(self, path=None, keep_finished_days=7):
+        self.path = path or os.path.join(data_dir(), "jobs.sqlite3")
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self.compact(keep_finished_days)
+
+    def add(self, job, outtmpl, profile):
+        """Records a new job and returns its id."""
+        now = time.time()
+        with self._lock:
+            cur = self._conn.execute(
+                "INSERT INTO jobs (url, format_id, path, name, outtmpl, profile, priority, state, created, updated)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (job.url, job.format_id, job.path, job.name, outtmpl, profile, job.priority, job.state, now, now))
+            return cur.lastrowid
+
+    def update(self, job_id, **fields):
+        if not fields: return
+        cols = ", ".join(f"{k} = ?" for k in fields)
+        with self._lock:
+            self._conn.execute(f"UPDATE jobs SET {cols}, updated = ? WHERE id = ?",
+                               (*fields.values(), time.time(), job_id))
+
+    def unfinished(self, profile=None):
+        """Jobs that were queued, running or paused when the previous process stopped."""
+        query = f"SELECT * FROM jobs WHERE state NOT IN ({', '.join('?' * len(FINISHED_STATES))})"
+        args = list(FINISHED_STATES)
+        if profile is not None:
+            query += " AND profile = ?"
+            args.append(profile)
+        with self._lock:
+            cur = self._conn.execute(query + " ORDER BY priority DESC, id", args)
+            cols = [c[0] for c in cur.description]
+            return [dict(zip(cols, row)) for row in cur.fetchall()]
+
+    def compact(self, keep_finished_days=7):
+        cutoff = time.time() - keep_finished_days * 86400
+        with self._lock:
+            self._conn.execute(f"DELETE FROM jobs WHERE state IN ({', '.join('?' * len(FINISHED_STATES))}) AND updated < ?",
+                               (*FINISHED_STATES, cutoff))
+            self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -1,76 +1,71 @@
 import customtkinter as ctk
-from tkinter import filedialog, messagebox
-import yt_dlp
-import threading
-import os
-import vlc
-import platform
+from tkinter import TclError, filedialog, messagebox
+import re
 import time
-from PIL import Image
-import urllib.request
-from io import BytesIO
-
-class DownloadTask(ctk.CTkFrame):
-    """Individual download card with Pause, Resume, and Cancel functionality."""
-    def __init__(self, master, filename, pause_callback, cancel_callback):
-        super().__init__(master, fg_color="#34495e", corner_radius=10)
-        self.pack(fill="x", pady=5, padx=5)
-        
-        # State flags
-        self.is_paused = False
-        self.is_cancelled = False
-        self.filename = filename
-
-        # UI Elements
-        self.label = ctk.CTkLabel(self, text=filename, font=("Arial", 11, "bold"), anchor="w")
-        self.label.pack(fill="x", padx=10, pady=(5, 0))
-        
-        self.p_bar = ctk.CTkProgressBar(self, height=8, progress_color="#2ecc71")
-        self.p_bar.set(0)
-        self.p_bar.pack(fill="x", padx=10, pady=5)
-        
-        self.stats = ctk.CTkLabel(self, text="Initializing...", font=("Arial", 10), text_color="#bdc3c7")
-        self.stats.pack(fill="x", padx=10, pady=(0, 2))
-
-        # Control Buttons Row
-        self.btn_row = ctk.CTkFrame(self, fg_color="transparent")
-        self.btn_row.pack(fill="x", padx=10, pady=5)
-
-        self.pause_btn = ctk.CTkButton(self.btn_row, text="Pause", width=60, height=22, 
-                                       fg_color="#f39c12", hover_color="#d35400",
-                                       command=lambda: pause_callback(self))
-        self.pause_btn.pack(side="left", padx=2)
-
-        self.cancel_btn = ctk.CTkButton(self.btn_row, text="Cancel", width=60, height=22, 
-                                        fg_color="#e74c3c", hover_color="#c0392b",
-                                        command=lambda: cancel_callback(self))
-        self.cancel_btn.pack(side="left", padx=2)
-
-    def update_stats(self, percent, speed, eta):
-        try:
-            p_val = float(percent.replace('%','').strip()) / 100
-            self.p_bar.set(p_val)
-            if not self.is_paused:
-                self.stats.configure(text=f"{percent} | {speed} | ETA: {eta}")
-            else:
-                self.stats.configure(text=f"PAUSED | {percent} cached")
-        except: pass
+import os
+from archive import DownloadArchive
+from bandwidth import BandwidthShaper, parse_rate, parse_schedule
+from engine import DownloadEngine
+from journal import JobJournal
+from metrics import Metrics
+from player import MediaPlayer
+from preview import PreviewServer
+from queue_view import QueueView
+from thumbnails import THUMB_SIZE, ThumbnailCache
+
+URL_RE = re.compile(r"https?://[^\s/]+\.[^\s]+")   # what a paste or the clipboard must hold to be analyzed early
 
 class ProDownloader(ctk.CTk):
+    TITLE = "Pro Media Center - Ultimate Edition"
+    PROFILE = "default"   # yt-dlp option profile from engine.PROFILES
+    PREVIEW_BYTES = 2 * 2**20   # written head of a download before the player switches to it
+    PREVIEW_RESERVE = 2**20     # bytes/s kept free for a remote preview of unknown bitrate
+    PLAYER_REFRESH_MS = 50      # at most this often the seek bar follows playback events
+    SPECULATE_MS = 300          # typing pause after which the URL in the entry is analyzed
+
     def __init__(self):
         super().__init__()
-        self.title("Pro Media Center - Ultimate Edition")
+        self.title(self.TITLE)
         self.geometry("1300x950")
         
         ctk.set_appearance_mode("Dark")
         ctk.set_default_color_theme("blue")
 
-        # VLC Engine
-        self.vlc_instance = vlc.Instance("--no-xlib --quiet --video-on-top")
-        self.player = self.vlc_instance.media_player_new()
+        # Download Engine: scheduler, info cache and progress board shared with the CLI/daemon
+        self.engine = DownloadEngine(self.PROFILE, max_jobs=3, max_connections=24, journal=JobJournal(),
+                                     metrics=Metrics(trace=os.environ.get("AVD_TRACE")),
+                                     archive=DownloadArchive(hash_files=bool(os.environ.get("AVD_HASH_FILES"))),
+                                     bandwidth=BandwidthShaper(schedule=parse_schedule(os.environ.get("AVD_SCHEDULE", ""))))
+        if os.environ.get("AVD_METRICS_PORT"): self.engine.metrics.serve(port=int(os.environ["AVD_METRICS_PORT"]))
+        self.thumbnails = ThumbnailCache(http=self.engine.http, metrics=self.engine.metrics)
+        # VLC runs on its own thread and reports through events; libvlc is created after the window is up
+        self.player = MediaPlayer(on_change=self._on_player_change, metrics=self.engine.metrics)
+        self._player_pending = False    # a refresh of the seek bar is already scheduled
+        self._seek_hold = 0.0           # the slider ignores playback time until then (user is dragging)
+        self._thumb_url = None
+        self.current_url = None     # URL behind the formats shown in format_combo
+        self.format_records = {}    # format_combo label -> formats.Format
+        self.preview = None         # PreviewServer, started for the first local preview
+        self._preview_job = None    # download that replaces the remote preview once far enough along
+        self._favored = None        # job feeding the local preview; it gets bandwidth first
+        self._local = None          # job the player reads through the PreviewServer
+        self.batch = None
+        self.batch_entries = {}     # entry label -> (index, url, info)
+        self._analysis = None       # engine.Analysis of the URL in url_entry, started on paste or ANALYZE
+        self._clip_analysis = None  # analysis of a URL seen on the clipboard
+        self._preview_url = None    # ANALYZE was pressed: play this URL once it is extracted
+        self._speculate_after = None
 
         self._build_ui()
-        self.update_loop()
+        # Jobs interrupted by the last exit or crash continue from their partial files
+        self.engine.restore(bind=self._add_task)
+        self.progress_loop()
+        # Once the window is drawn, warm yt-dlp's extractors and libvlc off the Tk thread
+        self.after_idle(self._warm_up)
+
+    def _warm_up(self):
+        self.engine.warm()
+        self.player.warm()
 
     def _build_ui(self):
         self.grid_columnconfigure(0, weight=3) 
@@ -110,89 +105,231 @@ class ProDownloader(ctk.CTk):
 
         self.url_entry = ctk.CTkEntry(self.right_panel, placeholder_text="Paste URL...", width=280)
         self.url_entry.pack(pady=5)
+        # Analysis starts as soon as a URL is pasted or typed, before ANALYZE is pressed
+        self.url_entry.bind("<KeyRelease>", self._on_url_edit)
+        self.url_entry.bind("<<Paste>>", self._on_url_edit)
+        self.bind("<FocusIn>", self._check_clipboard)
+
+        self.batch_var = ctk.BooleanVar(value=False)
+        self.batch_check = ctk.CTkCheckBox(self.right_panel, text="Playlist / multiple URLs", variable=self.batch_var)
+        self.batch_check.pack(pady=2)
 
         self.analyze_btn = ctk.CTkButton(self.right_panel, text="ANALYZE", command=self.start_analysis)
         self.analyze_btn.pack(pady=5, padx=20, fill="x")
 
+        # Batch entries (packed once a batch analysis returns its first result)
+        self.entry_combo = ctk.CTkComboBox(self.right_panel, values=[], width=280, command=self.select_batch_entry)
+        self.add_all_btn = ctk.CTkButton(self.right_panel, text="ADD ALL (best quality)", fg_color="#16a085", command=self.start_batch_download)
+
         self.format_combo = ctk.CTkComboBox(self.right_panel, values=["Quality (Size)"], width=280)
         self.format_combo.pack(pady=5)
 
         self.name_entry = ctk.CTkEntry(self.right_panel, placeholder_text="Filename", width=280)
         self.name_entry.pack(pady=5)
 
+        # Applies to running downloads as soon as it is confirmed
+        self.rate_entry = ctk.CTkEntry(self.right_panel, placeholder_text="Speed limit, e.g. 2M (empty = none)", width=280)
+        self.rate_entry.pack(pady=5)
+        self.rate_entry.bind("<Return>", self.apply_rate_limit)
+        self.rate_entry.bind("<FocusOut>", self.apply_rate_limit)
+
         self.download_btn = ctk.CTkButton(self.right_panel, text="ADD TO DOWNLOADS", state="disabled", fg_color="#27ae60", height=45, command=self.start_download)
         self.download_btn.pack(pady=10, padx=20, fill="x")
 
-        self.queue_container = ctk.CTkScrollableFrame(self.right_panel, height=400, fg_color="#1e272e")
-        self.queue_container.pack(fill="both", expand=True, padx=10, pady=10)
-
-    # --- HELPERS ---
-    def format_bytes(self, size):
-        if not size: return "N/A"
-        for unit in ['', 'K', 'M', 'G', 'T']:
-            if size < 1024: return f"{size:.1f}{unit}B"
-            size /= 1024
-        return f"{size:.1f}PB"
+        # Only the visible cards are real widgets; rows and completed jobs are plain data
+        self.queue_view = QueueView(self.right_panel, self.handle_task_pause, self.handle_task_cancel,
+                                    self.handle_task_bump, height=400, fg_color="#1e272e")
+        self.queue_view.pack(fill="both", expand=True, padx=10, pady=10)
 
     # --- PLAYER LOGIC ---
-    def _safe_vlc_refresh(self, media_url):
-        try:
-            self.player.stop()
-            time.sleep(0.2) 
-            win_id = self.video_frame.winfo_id()
-            if platform.system() == "Windows": self.player.set_hwnd(win_id)
-            else: self.player.set_xwindow(win_id)
-            self.player.set_media(self.vlc_instance.media_new(media_url))
-            self.player.play()
-        except: pass
+    def _play_media(self, media_url, start=None, local=None):
+        # Returns at once: stopping, opening and playing happen on the player's thread
+        job, self._local = self._local, local
+        # A settled job's loopback URL was only kept for as long as the player read it
+        if job is not None and job is not local and job.state in ("done", "error", "cancelled"):
+            self.preview.forget(job.id)
+        self.player.open(media_url, self.video_frame.winfo_id(), start)
+
+    def _on_player_change(self):
+        # Called on libvlc threads, several times a second while playing; one refresh per tick
+        if self._player_pending: return
+        self._player_pending = True
+        self.after(self.PLAYER_REFRESH_MS, self._refresh_player)
+
+    def _refresh_player(self):
+        self._player_pending = False
+        s = self.player.snapshot()
+        if s.length > 0 and time.monotonic() >= self._seek_hold: self.seek_slider.set(s.time / s.length * 100)
+        clock = lambda ms: time.strftime('%M:%S', time.gmtime(ms // 1000))
+        text = f"{clock(s.time)} / {clock(s.length)}"
+        if s.status == "buffering": text += f"  (buffering {s.buffering:.0f}%)"
+        elif s.status == "error": text += "  (playback error)"
+        if text != self.time_label.cget("text"): self.time_label.configure(text=text)
+        if s.status in ("stopped", "ended", "error"):
+            # Nothing is previewing any more: downloads get the whole link back
+            self._favor(None)
+            self.engine.bandwidth.reserve(0)
+
+    def _download_for(self, url):
+        jobs = [j for j in list(self.engine.jobs.values()) if j.url == url and j.state not in ("cancelled", "error")]
+        return jobs[-1] if jobs else None
+
+    def _play_local(self, job):
+        """Points the player at the job's partial file through the loopback PreviewServer."""
+        if self.preview is None: self.preview = PreviewServer()
+        self._preview_job = None
+        self._favor(job)
+        self.engine.bandwidth.reserve(0)
+        self._play_media(self.preview.url(job.id, job.partial), local=job)
+
+    def _preview_settled(self, job):
+        if job is not self._local:
+            self.preview.forget(job.id)
+            return
+        # The merge deleted the file being previewed: carry on in the merged output
+        output = job.partial.output
+        if job.state == "done" and output and output != job.partial.filename and os.path.exists(output):
+            self._play_media(output, start=self.player.snapshot().time / 1000)
+
+    def _favor(self, job):
+        if job is self._favored: return
+        if self._favored is not None: self.engine.bandwidth.favor(self._favored, False)
+        if job is not None: self.engine.bandwidth.favor(job)
+        self._favored = job
 
     def toggle_fullscreen_mode(self):
-        self.player.set_fullscreen(not self.player.get_fullscreen())
+        self.player.toggle_fullscreen()
 
-    def set_position(self, value): 
-        if self.player.get_length() > 0: self.player.set_position(float(value) / 100.0)
-
-    def update_loop(self):
-        if self.player.is_playing():
-            curr, total = self.player.get_time() // 1000, self.player.get_length() // 1000
-            if total > 0:
-                self.seek_slider.set((curr / total) * 100)
-                self.time_label.configure(text=f"{time.strftime('%M:%S', time.gmtime(curr))} / {time.strftime('%M:%S', time.gmtime(total))}")
-        self.after(1000, self.update_loop)
+    def set_position(self, value):
+        self._seek_hold = time.monotonic() + 0.5
+        self.player.seek(float(value) / 100.0)
 
     # --- ANALYSIS LOGIC ---
+    def _on_url_edit(self, event=None):
+        # <<Paste>> fires before the text is inserted; wait for typing or pasting to settle
+        if self._speculate_after is not None: self.after_cancel(self._speculate_after)
+        self._speculate_after = self.after(self.SPECULATE_MS, self._speculate_entry)
+
+    def _speculate_entry(self):
+        self._speculate_after = None
+        url = self.url_entry.get().strip()
+        speculate = not self.batch_var.get() and URL_RE.fullmatch(url)
+        # An analysis of text no longer in the entry must not replace the formats shown
+        if self._analysis is not None and (not speculate or self._analysis.url != url):
+            self._analysis.cancel()
+            self._analysis = None
+            self.analyze_btn.configure(state="normal", text="ANALYZE")
+        if speculate and url != self.current_url: self._analyze(url)
+
+    def _check_clipboard(self, event=None):
+        # A URL copied in the browser is extracted while the user switches back and pastes it
+        try:
+            text = self.clipboard_get().strip()
+        except TclError:        # empty, or not text
+            return
+        if not URL_RE.fullmatch(text) or (self._clip_analysis and self._clip_analysis.url == text): return
+        if self._clip_analysis is not None and self._clip_analysis is not self._analysis: self._clip_analysis.cancel()
+        self._clip_analysis = self.engine.analyze(text)
+
     def start_analysis(self):
-        url = self.url_entry.get()
+        url = self.url_entry.get().strip()
         if not url: return
         self.analyze_btn.configure(state="disabled", text="ANALYZING...")
-        threading.Thread(target=self.fetch_info, args=(url,), daemon=True).start()
+        if self.batch_var.get():
+            self.start_batch_analysis(url.split())
+        else:
+            self._preview_url = url
+            self._analyze(url, force=True)
+
+    def _analyze(self, url, force=False):
+        """Starts (or joins) the analysis of `url` and shows it as its parts complete.
+
+        The thumbnail and the preview start as soon as the extractor returns, the format list
+        once sizes are probed. Results of an analysis the URL has moved on from are dropped.
+        """
+        if self._analysis is not None and self._analysis.url == url and not force: return
+        if self._analysis is not None and self._analysis.url != url: self._analysis.cancel()
+        analysis = self._analysis = self.engine.analyze(url)
+        # Callbacks run on the analysis thread (or here when already done); the UI work goes to Tk
+        analysis.extracted.add_done_callback(lambda fut: self.after(0, lambda: self._on_extracted(analysis, fut)))
+        analysis.info.add_done_callback(lambda fut: self.after(0, lambda: self._on_analyzed(analysis, fut)))
+
+    def _on_extracted(self, analysis, future):
+        if analysis is not self._analysis or future.cancelled() or future.exception() is not None: return
+        info = future.result()
+        self._show_thumbnail(info)
+        if self._preview_url == analysis.url:
+            self._preview_url = None
+            self._start_preview(analysis.url, info)
+
+    def _on_analyzed(self, analysis, future):
+        if analysis is not self._analysis or future.cancelled(): return
+        if future.exception() is None and analysis.url != self.current_url:
+            self._show_formats(analysis.url, future.result())
+        self.analyze_btn.configure(state="normal", text="ANALYZE")
 
-    def fetch_info(self, url):
-        try:
-            with yt_dlp.YoutubeDL({'quiet': True, 'noplaylist': True}) as ydl:
-                info = ydl.extract_info(url, download=False)
-                
-                # Thumbnail Update
-                if info.get('thumbnail'):
-                    with urllib.request.urlopen(info['thumbnail']) as u:
-                        img = Image.open(BytesIO(u.read()))
-                    self.after(0, lambda i=img: self.thumb_box.configure(image=ctk.CTkImage(i, size=(280, 150)), text=""))
-
-                self.after(0, lambda: self._safe_vlc_refresh(info['url']))
-                
-                title = info.get('title', 'video')[:30]
-                format_list = []
-                for f in info.get('formats', []):
-                    if f.get('vcodec') != 'none':
-                        res = f.get('resolution', 'N/A')
-                        fid = f.get('format_id')
-                        raw_size = f.get('filesize') or f.get('filesize_approx')
-                        size_str = self.format_bytes(raw_size)
-                        format_list.append(f"{res} ({size_str}) ID:{fid}")
-                
-                self.after(0, lambda: self.update_ui_post_analysis(title, format_list))
-        except:
-            self.after(0, lambda: self.analyze_btn.configure(state="normal", text="ANALYZE"))
+    def show_info(self, url, info):
+        self._show_thumbnail(info)
+        self._start_preview(url, info)
+        self._show_formats(url, info)
+
+    def _show_thumbnail(self, info):
+        # Streamed, decoded and scaled on the thumbnail workers
+        if info.get('thumbnail') == self._thumb_url: return
+        self._thumb_url = info.get('thumbnail')
+        if self._thumb_url:
+            self.thumbnails.submit(self._thumb_url, self.engine.http_headers()).add_done_callback(
+                lambda fut, u=self._thumb_url: self._on_thumbnail(u, fut))
+
+    def _start_preview(self, url, info):
+        # A download of this URL already on disk is previewed from there instead of the network
+        job = self._download_for(url)
+        if job is not None and job.partial is not None and job.partial.available(0) >= self.PREVIEW_BYTES:
+            self._play_local(job)
+        elif info.get('url'):
+            self._play_media(info['url'])
+            self._preview_job = job
+            # The player streams outside the engine; downloads leave it room under a cap
+            self._favor(None)
+            self.engine.bandwidth.reserve((info.get('tbr') or 0) * 125 or self.PREVIEW_RESERVE)
+
+    def _show_formats(self, url, info):
+        self.current_url = url
+        self.format_records = dict(self.engine.catalog(info).choices())
+        self.update_ui_post_analysis(info.get('title', 'video')[:30], list(self.format_records))
+
+    # --- BATCH / PLAYLIST ANALYSIS ---
+    def start_batch_analysis(self, urls):
+        if self.batch: self.batch.cancel()
+        self.batch_entries.clear()
+        self.entry_combo.configure(values=[])
+        self.entry_combo.set("")
+        # Results arrive on analysis workers; every UI change is marshalled onto the Tk thread
+        self.batch = self.engine.analyze_batch(
+            urls,
+            on_result=lambda i, u, info: self.after(0, lambda: self._add_batch_entry(i, u, info)),
+            on_done=lambda: self.after(0, lambda: self.analyze_btn.configure(state="normal", text="ANALYZE")))
+
+    def _add_batch_entry(self, index, url, info):
+        label = f"{index + 1:03d}. {info.get('title', 'video')[:40]}"
+        self.batch_entries[label] = (index, url, info)
+        self.entry_combo.configure(values=sorted(self.batch_entries, key=lambda k: self.batch_entries[k][0]))
+        if len(self.batch_entries) == 1:
+            self.entry_combo.pack(pady=5, before=self.format_combo)
+            self.add_all_btn.pack(pady=5, padx=20, fill="x", before=self.format_combo)
+            self.entry_combo.set(label)
+            self.select_batch_entry(label)
+        self.add_all_btn.configure(text=f"ADD ALL {len(self.batch_entries)} (best quality)")
+
+    def select_batch_entry(self, label):
+        if label in self.batch_entries:
+            _, url, info = self.batch_entries[label]
+            self.show_info(url, info)
+
+    def _on_thumbnail(self, thumb_url, future):
+        if future.exception() is not None or thumb_url != self._thumb_url: return
+        img = future.result()
+        self.after(0, lambda: self.thumb_box.configure(image=ctk.CTkImage(img, size=THUMB_SIZE), text=""))
 
     def update_ui_post_analysis(self, title, formats):
         self.name_entry.delete(0, 'end')
@@ -203,58 +340,85 @@ class ProDownloader(ctk.CTk):
         self.analyze_btn.configure(state="normal", text="ANALYZE")
 
     # --- DOWNLOAD & CONTROL LOGIC ---
-    def handle_task_pause(self, task):
-        task.is_paused = not task.is_paused
-        task.pause_btn.configure(text="Resume" if task.is_paused else "Pause",
-                                 fg_color="#2ecc71" if task.is_paused else "#f39c12")
-
-    def handle_task_cancel(self, task):
-        if messagebox.askyesno("Cancel", f"Cancel download for {task.filename}?"):
-            task.is_cancelled = True
-            task.stats.configure(text="Cancelling...")
+    def apply_rate_limit(self, event=None):
+        try:
+            rate = parse_rate(self.rate_entry.get())
+        except ValueError:
+            self.rate_entry.configure(border_color="#e74c3c")
+            return
+        self.rate_entry.configure(border_color=ctk.ThemeManager.theme["CTkEntry"]["border_color"])
+        self.engine.bandwidth.set_rate(rate)
+
+    def handle_task_pause(self, row):
+        row.paused = not row.paused
+        if row.paused:
+            self.engine.pause(row.job)
+            row.text = row.paused_text()
+        else:
+            self.engine.resume(row.job)
+            row.text = "Resuming..."
+        self.queue_view.redraw()
+
+    def handle_task_cancel(self, row):
+        if messagebox.askyesno("Cancel", f"Cancel download for {row.name}?"):
+            if not self.engine.cancel(row.job):
+                row.text = "Cancelling..."
+                self.queue_view.redraw()
+
+    def handle_task_bump(self, row):
+        if self.engine.bump(row.job):
+            row.text = "Queued (next up)"
+            self.queue_view.redraw()
 
     def start_download(self):
+        url, name = self.url_entry.get().strip(), self.name_entry.get()
+        # A typed entry is taken as a format id or catalog query ("best:size<=500M")
+        choice = self.format_combo.get().strip()
+        if not url: return
+        if choice in self.format_records and url != self.current_url:
+            messagebox.showinfo("Download", "The formats shown are for another URL; analyze this one first.")
+            return
         path = filedialog.askdirectory()
         if not path: return
-        url, name = self.url_entry.get(), self.name_entry.get()
-        fid = self.format_combo.get().split("ID:")[-1]
-        
-        task_ui = DownloadTask(self.queue_container, name, self.handle_task_pause, self.handle_task_cancel)
-        threading.Thread(target=self.execute_download, args=(url, fid, path, name, task_ui), daemon=True).start()
-
-    def execute_download(self, url, fid, path, name, task_ui):
-        def progress_hook(d):
-            # 1. Handle Cancellation
-            if task_ui.is_cancelled:
-                raise Exception("STOP_DOWNLOAD")
-
-            # 2. Handle Pausing (Busy Wait)
-            while task_ui.is_paused:
-                if task_ui.is_cancelled: raise Exception("STOP_DOWNLOAD")
-                time.sleep(0.5)
-
-            if d['status'] == 'downloading':
-                self.after(0, lambda: task_ui.update_stats(d.get('_percent_str', '0%'), d.get('_speed_str', 'N/A'), d.get('_eta_str', 'N/A')))
-            elif d['status'] == 'finished':
-                self.after(0, lambda: task_ui.stats.configure(text="COMPLETE", text_color="#2ecc71"))
-                self.after(0, lambda: task_ui.btn_row.pack_forget())
-
-        opts = {
-            'format': f'{fid}+bestaudio/best',
-            'outtmpl': os.path.join(path, f"{name}.%(ext)s"),
-            'progress_hooks': [progress_hook],
-            'concurrent_fragment_downloads': 12,
-            'quiet': True
-        }
+        fid = self.format_records[choice].format_id if choice in self.format_records else choice
 
-        try:
-            with yt_dlp.YoutubeDL(opts) as ydl:
-                ydl.download([url])
-        except Exception as e:
-            if "STOP_DOWNLOAD" in str(e):
-                self.after(0, task_ui.destroy)
-            else:
-                self.after(0, lambda: task_ui.stats.configure(text="ERROR", text_color="#e74c3c"))
+        row = self.queue_view.add(name)
+        row.job = self.engine.submit(url, fid, path, name, task=row)
+        # The remote preview of this URL stops once the download has written enough to play
+        if url == self.current_url: self._preview_job = row.job
+
+    def start_batch_download(self):
+        path = filedialog.askdirectory()
+        if not path: return
+        for _, url, info in sorted(self.batch_entries.values(), key=lambda e: e[0]):
+            name = info.get('title', 'video')[:30]
+            best = self.engine.catalog(info).best()
+            row = self.queue_view.add(name)
+            row.job = self.engine.submit(url, best.format_id if best else "bestvideo*", path, name, task=row)
+
+    def _add_task(self, job):
+        row = self.queue_view.add(job.name, job)
+        job.task = row
+        if job.paused:
+            row.paused = True
+            row.text = row.paused_text()
+
+    def progress_loop(self):
+        # Folds the latest state of every job that changed since the previous tick into its
+        # row, then redraws only the visible cards
+        for job, p in self.engine.progress.drain().items():
+            if job.task is None: continue
+            if self.queue_view.apply(job.task, p):
+                # Finished, failed or cancelled: the history keeps what the list still shows
+                self.engine.progress.forget(job)
+                job.task = None
+                if self.preview is not None: self._preview_settled(job)
+        self.queue_view.refresh()
+        job = self._preview_job
+        if job is not None:
+            if job.state in ("cancelled", "error"): self._preview_job = None
+            elif job.partial is not None and job.partial.available(0) >= self.PREVIEW_BYTES: self._play_local(job)
+        self.after(100, self.progress_loop)
 
 if __name__ == "__main__":
     app = ProDownloader()
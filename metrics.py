@@ -0,0 +1,147 @@
+import json
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+
+HELP = {
+    'phase_seconds': ("histogram", "Duration of engine phases (extract, probe, thumbnail, first_byte, download, merge, warm, vlc_init)"),
+    'errors_total': ("counter", "Failures by phase and root error class"),
+    'retries_total': ("counter", "Transfer retries by kind (http, fragment, segment) and error class"),
+    'download_bytes_total': ("counter", "Bytes written by download jobs (a resumed file counts from its start)"),
+    'fragments_total': ("counter", "HLS/DASH fragments appended, by where they were held (memory, disk)"),
+    'info_cache_total': ("counter", "Info cache lookups by result"),
+    'ydl_pool_total': ("counter", "YoutubeDL instances taken from the pool (hit) or built for the call (miss)"),
+    'dedup_total': ("counter", "Downloads avoided through the archive (skip, link, stream, hash)"),
+    'bandwidth_wait_seconds_total': ("counter", "Time transfers spent held back by rate caps"),
+    'queue_claims_total': ("counter", "Jobs claimed from the lease queue, by whether an expired lease was taken over"),
+    'jobs_total': ("counter", "Finished job runs by outcome"),
+    'jobs': ("gauge", "Known jobs by state"),
+}
+
+
+def error_class(exc):
+    """Class name of the root cause; yt-dlp wraps network and extractor errors in DownloadError."""
+    inner = getattr(exc, 'exc_info', None)
+    if inner and inner[1] is not None: exc = inner[1]
+    return type(exc).__name__
+
+
+def _number(value):
+    return str(value) if isinstance(value, int) else repr(float(value))
+
+
+def _labels(labels):
+    if not labels: return ""
+    return "{" + ",".join(f'{k}="{str(v)}"'.replace("\n", " ") for k, v in labels) + "}"
+
+
+class Metrics:
+    """Counters, phase histograms and an optional JSON-lines trace for the engine.
+
+    Metric labels are kept low-cardinality (phase, kind, error class); per-job detail such
+    as ids and URLs only goes to the trace. `render()` returns the Prometheus text format.
+    """
+    def __init__(self, trace=None, prefix="avd_"):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._counters = {}        # (name, labels) -> value
+        self._histograms = {}      # (name, labels) -> [bucket counts..., sum, count]
+        self._gauges = {}          # name -> callable returning {labels dict tuple: value}
+        self._trace = open(trace, "a", buffering=1, encoding="utf-8") if isinstance(trace, str) else trace
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock: self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, seconds, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            h = self._histograms.get(key)
+            if h is None: h = self._histograms[key] = [0] * len(BUCKETS) + [0.0, 0]
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound: h[i] += 1
+            h[-2] += seconds
+            h[-1] += 1
+
+    def gauge(self, name, collect):
+        """`collect()` returns {((label, value), ...): number}, evaluated on every render."""
+        self._gauges[name] = collect
+
+    # --- PHASES AND ERRORS ---
+    @contextmanager
+    def phase(self, name, labels=None, **fields):
+        """Times the block as phase `name`; an exception is counted by class and re-raised."""
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            self.record_phase(name, time.perf_counter() - start, e, labels, **fields)
+            raise
+        self.record_phase(name, time.perf_counter() - start, None, labels, **fields)
+
+    def record_phase(self, name, seconds, error=None, labels=None, **fields):
+        self.observe('phase_seconds', seconds, phase=name, **(labels or {}))
+        if error is not None: self.inc('errors_total', phase=name, error=error_class(error))
+        self.trace('phase', phase=name, seconds=round(seconds, 6),
+                   error=error_class(error) if error is not None else None, **(labels or {}), **fields)
+
+    def error(self, phase, exc, **fields):
+        """Counts a failure outside a timed phase (UI callbacks, player, background work)."""
+        self.inc('errors_total', phase=phase, error=error_class(exc))
+        self.trace('error', phase=phase, error=error_class(exc), message=str(exc), **fields)
+
+    def trace(self, event, **fields):
+        if self._trace is None: return
+        line = json.dumps({'ts': round(time.time(), 6), 'event': event, **fields}, default=str)
+        with self._lock: self._trace.write(line + "\n")
+
+    # --- EXPOSITION ---
+    def render(self):
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {k: list(v) for k, v in self._histograms.items()}
+        out = []
+        names = sorted({k[0] for k in counters} | {k[0] for k in histograms} | set(self._gauges))
+        for name in names:
+            full = self.prefix + name
+            kind, text = HELP.get(name, ("untyped", name))
+            out += [f"# HELP {full} {text}", f"# TYPE {full} {kind}"]
+            for (n, labels), value in sorted(counters.items()):
+                if n == name: out.append(f"{full}{_labels(labels)} {_number(value)}")
+            for (n, labels), h in sorted(histograms.items()):
+                if n != name: continue
+                for bound, count in zip(BUCKETS, h):
+                    out.append(f"{full}_bucket{_labels(labels + (('le', bound),))} {count}")
+                out.append(f"{full}_bucket{_labels(labels + (('le', '+Inf'),))} {h[-1]}")
+                out.append(f"{full}_sum{_labels(labels)} {h[-2]:.6f}")
+                out.append(f"{full}_count{_labels(labels)} {h[-1]}")
+            if name in self._gauges:
+                for labels, value in sorted(self._gauges[name]().items()):
+                    out.append(f"{full}{_labels(labels)} {_number(value)}")
+        return "\n".join(out) + "\n"
+
+    def serve(self, host="127.0.0.1", port=9464):
+        """Serves GET /metrics on a background thread and returns the server."""
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != "/metrics":
+                    self.send_error(404)
+                    return
+                data = metrics.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+        return server
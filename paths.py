@@ -0,0 +1,33 @@
+import os
+import platform
+
+APP_NAME = "any-video-downloader"
+
+
+def _base(kind):
+    # AVD_HOME keeps every cache and journal under one directory (benchmarks, portable installs)
+    if os.environ.get("AVD_HOME"): return os.path.join(os.environ["AVD_HOME"], kind)
+    system = platform.system()
+    if system == "Windows":
+        root = os.environ.get("LOCALAPPDATA") or os.path.expanduser(r"~\AppData\Local")
+        return os.path.join(root, APP_NAME, kind)
+    if system == "Darwin":
+        root = "~/Library/Caches" if kind == "cache" else "~/Library/Application Support"
+        return os.path.join(os.path.expanduser(root), APP_NAME)
+    if kind == "cache": root = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    else: root = os.environ.get("XDG_DATA_HOME") or os.path.expanduser("~/.local/share")
+    return os.path.join(root, APP_NAME)
+
+
+def cache_dir(*parts):
+    """Per-user cache directory (safe to delete), created on first use."""
+    path = os.path.join(_base("cache"), *parts)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def data_dir(*parts):
+    """Per-user data directory for state that must survive restarts, created on first use."""
+    path = os.path.join(_base("data"), *parts)
+    os.makedirs(path, exist_ok=True)
+    return path
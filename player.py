@@ -0,0 +1,168 @@
+import platform
+import queue
+import threading
+from contextlib import nullcontext
+
+
+class PlayerState:
+    """What the UI shows about the player; times in milliseconds, length 0 while unknown."""
+    __slots__ = ('status', 'time', 'length', 'buffering', 'media')
+
+    def __init__(self, status="idle", time=0, length=0, buffering=100.0, media=None):
+        self.status = status        # idle | opening | buffering | playing | paused | stopped | ended | error
+        self.time = time
+        self.length = length
+        self.buffering = buffering
+        self.media = media
+
+    def copy(self):
+        return PlayerState(self.status, self.time, self.length, self.buffering, self.media)
+
+
+class MediaPlayer:
+    """libvlc player run from one worker thread and observed through libvlc events.
+
+    Calls that can block inside libvlc (creating the instance, stopping the previous media,
+    opening, seeking) are queued to the "vlc" thread, so the caller never waits on VLC.
+    Position, length, buffering and state changes arrive as libvlc events and are folded into
+    a PlayerState; `on_change()` is then called from a libvlc thread and the caller picks the
+    state up with `snapshot()`. New media is preparsed in the background so its length is
+    known before the first frame. Seeks issued faster than VLC performs them collapse into the
+    latest one.
+    """
+    def __init__(self, on_change=None, metrics=None, args="--no-xlib --quiet --video-on-top"):
+        self.on_change = on_change
+        self.metrics = metrics
+        self.args = args
+        self.instance = None
+        self.player = None
+        self._state = PlayerState()
+        self._lock = threading.Lock()
+        self._media = None           # the current vlc.Media, kept alive while its events may fire
+        self._seek = None            # latest requested position not yet applied
+        self._commands = queue.SimpleQueue()
+        threading.Thread(target=self._loop, name="vlc", daemon=True).start()
+
+    # --- CONTROLS (any thread) ---
+    def warm(self):
+        """Creates the libvlc instance ahead of the first preview (plugin scan)."""
+        self._submit(self._ensure)
+
+    def open(self, url, window=None, start=None):
+        """Plays `url` in the native window `window` (a Tk winfo_id, taken on the Tk thread),
+        from `start` seconds in if given."""
+        self._update(status="opening", time=int((start or 0) * 1000), length=0, buffering=0.0, media=url)
+        self._submit(lambda: self._open(url, window, start))
+
+    def play(self):
+        self._submit(lambda: self._ensure().play())
+
+    def pause(self):
+        self._submit(lambda: self._ensure().set_pause(1))
+
+    def stop(self):
+        self._submit(lambda: self._ensure().stop())
+
+    def toggle_fullscreen(self):
+        self._submit(lambda: self._ensure().toggle_fullscreen())
+
+    def seek(self, fraction):
+        with self._lock:
+            pending, self._seek = self._seek is not None, min(max(fraction, 0.0), 1.0)
+            if self._state.length: self._state.time = int(self._seek * self._state.length)
+        if not pending: self._submit(self._apply_seek)
+
+    def snapshot(self):
+        with self._lock: return self._state.copy()
+
+    def close(self):
+        self._submit(None)
+
+    # --- WORKER ---
+    def _submit(self, command):
+        self._commands.put(command)
+
+    def _loop(self):
+        while (command := self._commands.get()) is not None:
+            try:
+                command()
+            except Exception as e:
+                if self.metrics is not None: self.metrics.error('player', e)
+                self._update(status="error")
+        if self.player is not None: self.player.release()
+
+    def _ensure(self):
+        if self.player is None:
+            import vlc
+            with self.metrics.phase('vlc_init') if self.metrics is not None else nullcontext():
+                self.instance = vlc.Instance(self.args)
+                self.player = self.instance.media_player_new()
+            E = vlc.EventType
+            events = self.player.event_manager()
+            for kind, handler in (
+                    (E.MediaPlayerTimeChanged, lambda e: self._update(time=e.u.new_time)),
+                    (E.MediaPlayerLengthChanged, lambda e: self._update(length=e.u.new_length)),
+                    (E.MediaPlayerBuffering, self._on_buffering),
+                    (E.MediaPlayerPlaying, lambda e: self._update(status="playing", buffering=100.0)),
+                    (E.MediaPlayerPaused, lambda e: self._update(status="paused")),
+                    (E.MediaPlayerStopped, self._on_stopped),
+                    (E.MediaPlayerEndReached, lambda e: self._update(status="ended")),
+                    (E.MediaPlayerEncounteredError, lambda e: self._update(status="error"))):
+                events.event_attach(kind, handler)
+        return self.player
+
+    def _open(self, url, window, start=None):
+        import vlc
+        player = self._ensure()
+        player.stop()                # waits for the previous input thread to wind down
+        if window:
+            if platform.system() == "Windows": player.set_hwnd(window)
+            elif platform.system() == "Darwin": player.set_nsobject(window)
+            else: player.set_xwindow(window)
+        media = self.instance.media_new(url)
+        if start: media.add_option(f"start-time={start:.3f}")
+        # Parsed on libvlc's preparser thread; the duration arrives before playback starts
+        media.event_manager().event_attach(vlc.EventType.MediaParsedChanged,
+                                           lambda e: self._submit(lambda: self._parsed(media)))
+        media.parse_with_options(vlc.MediaParseFlag.network, 10000)
+        self._media = media
+        with self._lock: self._seek = None
+        player.set_media(media)
+        player.play()
+
+    def _parsed(self, media):
+        # Handlers may not call back into libvlc, so the duration is read here on the worker
+        duration = media.get_duration()
+        if media is self._media and duration > 0:
+            with self._lock:
+                if not self._state.length: self._state.length = duration
+            self._changed()
+
+    def _apply_seek(self):
+        with self._lock: fraction, self._seek = self._seek, None
+        if fraction is not None and self.player is not None and self.player.is_seekable():
+            self.player.set_position(fraction)
+
+    # --- EVENTS (libvlc threads) ---
+    def _on_buffering(self, event):
+        cache = event.u.new_cache
+        with self._lock:
+            self._state.buffering = cache
+            if cache < 100: self._state.status = "buffering"
+            elif self._state.status == "buffering": self._state.status = "playing"
+        self._changed()
+
+    def _on_stopped(self, event):
+        with self._lock:
+            if self._state.status == "opening": return     # the previous media, stopped by open()
+            self._state.status = "stopped"
+        self._changed()
+
+    def _update(self, **fields):
+        with self._lock:
+            if self._seek is not None: fields.pop('time', None)     # keep the seek target until applied
+            for k, v in fields.items(): setattr(self._state, k, v)
+        self._changed()
+
+    def _changed(self):
+        if self.on_change is not None: self.on_change()
@@ -0,0 +1,27 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+def _lower_priority():
+    # On Linux niceness is per thread and inherited by the ffmpeg children this thread starts,
+    # so merges yield the CPU to download and UI threads while still using every idle core
+    try: os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 10)
+    except (AttributeError, OSError): pass
+
+
+class PostProcessQueue:
+    """Queue of post-processing work (merge, remux, fixups, thumbnail embedding) for finished downloads.
+
+    The work itself happens in ffmpeg child processes; `workers` (one per core by default)
+    bounds how many run at once. Jobs wait here without holding a download slot or a connection.
+    """
+    def __init__(self, workers=None):
+        self.workers = workers or os.cpu_count() or 2
+        self._pool = ThreadPoolExecutor(self.workers, thread_name_prefix="postprocess", initializer=_lower_priority)
+
+    def submit(self, fn, *args):
+        return self._pool.submit(fn, *args)
+
+    def shutdown(self, wait=True):
+        self._pool.shutdown(wait=wait)
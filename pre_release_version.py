@@ -3,12 +3,12 @@ from tkinter import filedialog, messagebox
 import yt_dlp
 import threading
 import os
-import vlc
-import platform
 import time
 from PIL import Image
 import urllib.request
 from io import BytesIO
+from downloaders import EngineYDL
+from player import MediaPlayer
 
 class DownloadTask(ctk.CTkFrame):
     def __init__(self, master, filename):
@@ -30,6 +30,8 @@ class DownloadTask(ctk.CTkFrame):
         except: pass
 
 class ProDownloader(ctk.CTk):
+    MAX_CONNECTIONS = 24
+
     def __init__(self):
         super().__init__()
         self.title("Pro Media Center - Size Estimator")
@@ -37,9 +39,12 @@ class ProDownloader(ctk.CTk):
         
         ctk.set_appearance_mode("Dark")
         ctk.set_default_color_theme("blue")
+        # Fragment connections of all downloads together; each job adapts its own share
+        self.connections = threading.BoundedSemaphore(self.MAX_CONNECTIONS)
 
-        self.vlc_instance = vlc.Instance("--no-xlib --quiet --video-on-top")
-        self.player = self.vlc_instance.media_player_new()
+        # libvlc is driven from the player's own thread and reports through events
+        self._player_pending = False
+        self.player = MediaPlayer(on_change=self._on_player_change)
 
         self.grid_columnconfigure(0, weight=3) 
         self.grid_columnconfigure(1, weight=1) 
@@ -108,29 +113,29 @@ class ProDownloader(ctk.CTk):
         return f"{size:.1f} {power_labels[n]}B"
 
     def _safe_vlc_refresh(self, media_url):
-        try:
-            self.player.stop()
-            time.sleep(0.1)
-            win_id = self.video_frame.winfo_id()
-            if platform.system() == "Windows": self.player.set_hwnd(win_id)
-            else: self.player.set_xwindow(win_id)
-            self.player.set_media(self.vlc_instance.media_new(media_url))
-            self.player.play()
-        except: pass
+        # Returns at once: stopping, opening and playing happen on the player's thread
+        self.player.open(media_url, self.video_frame.winfo_id())
 
     def toggle_fullscreen_mode(self):
-        self.player.set_fullscreen(not self.player.get_fullscreen())
+        self.player.toggle_fullscreen()
 
     def set_position(self, value): 
-        if self.player.get_length() > 0: self.player.set_position(float(value) / 100.0)
+        self.player.seek(float(value) / 100.0)
+
+    def _on_player_change(self):
+        # Called on libvlc threads, several times a second while playing; one refresh per 250 ms
+        if self._player_pending: return
+        self._player_pending = True
+        self.after(250, self.update_loop)
 
     def update_loop(self):
-        if self.player.is_playing():
-            curr, total = self.player.get_time() // 1000, self.player.get_length() // 1000
+        self._player_pending = False
+        s = self.player.snapshot()
+        if s.status == "playing":
+            curr, total = s.time // 1000, s.length // 1000
             if total > 0:
                 self.seek_slider.set((curr / total) * 100)
                 self.time_label.configure(text=f"{time.strftime('%M:%S', time.gmtime(curr))} / {time.strftime('%M:%S', time.gmtime(total))}")
-        self.after(1000, self.update_loop)
 
     def start_analysis(self):
         url = self.url_entry.get()
@@ -193,8 +198,9 @@ class ProDownloader(ctk.CTk):
                 task_ui.update_stats("100%", "Complete", "00:00")
                 task_ui.configure(fg_color="#16a085")
 
-        opts = {'format': f'{fid}+bestaudio/best', 'outtmpl': os.path.join(path, f"{name}.%(ext)s"), 'progress_hooks': [hook], 'concurrent_fragment_downloads': 12}
-        with yt_dlp.YoutubeDL(opts) as ydl:
+        # 12 is only the ceiling: HLS/DASH fragments run under an adaptive limit within self.connections
+        opts = {'format': f'{fid}+bestaudio/best', 'noplaylist': True, 'outtmpl': os.path.join(path, f"{name}.%(ext)s"), 'progress_hooks': [hook], 'concurrent_fragment_downloads': 12}
+        with EngineYDL(opts, budget=self.connections) as ydl:
             ydl.download([url])
 
 if __name__ == "__main__":
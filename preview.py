@@ -0,0 +1,160 @@
+import os
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import quote
+
+CHUNK = 256 * 1024
+
+
+class PartialFile:
+    """The media file a running job is writing, as far as it has got.
+
+    Fed from the job's progress hooks. It follows the first file the job writes (the video of
+    a merged download; the audio comes after it) from `.part` to its final name. Without
+    `written_ranges` from the downloader, the written part is taken to be the file's prefix,
+    which holds for sequential HTTP and for HLS/DASH fragments appended in order. A merge
+    deletes that file once done; `output` is then the merged file that replaced it.
+    """
+    def __init__(self):
+        self.filename = None
+        self.tmpfilename = None
+        self.output = None          # set by the engine when post-processing produced another file
+        self.total = None           # exact size when the downloader knows it
+        self.ranges = None          # inclusive (start, end) written ranges, for segmented files
+        self.done = False
+        self._cond = threading.Condition()
+
+    def update(self, d):
+        with self._cond:
+            if self.filename is None: self.filename = d.get('filename')
+            elif d.get('filename') != self.filename: return
+            self.tmpfilename = d.get('tmpfilename') or self.tmpfilename
+            self.total = d.get('total_bytes') or self.total
+            self.ranges = d.get('written_ranges')
+            if d.get('status') == 'finished': self.ranges, self.done = None, True
+            self._cond.notify_all()
+
+    def finish(self):
+        with self._cond:
+            self.done = True
+            self._cond.notify_all()
+
+    def path(self):
+        for path in (self.tmpfilename, self.filename):
+            if path and os.path.exists(path): return path
+        return None
+
+    def available(self, offset):
+        """Bytes that can be read contiguously from `offset` right now."""
+        ranges = self.ranges
+        if ranges is not None:
+            for first, last in ranges:
+                if first <= offset <= last: return last - offset + 1
+            return 0
+        path = self.path()
+        try: return max(0, os.path.getsize(path) - offset) if path else 0
+        except OSError: return 0
+
+    def wait(self, offset, timeout):
+        """Waits until data at `offset` is written; returns how much is readable (0 on timeout or end)."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                n = self.available(offset)
+                if n or self.done or time.monotonic() >= deadline: return n
+                # Hooks only arrive a few times a second; the file itself may grow sooner
+                self._cond.wait(0.1)
+
+    def read(self, offset, size):
+        # Reopened per chunk so the downloader can still rename or delete it (Windows locks open files)
+        path = self.path()
+        if path is None: return b""
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            return f.read(size)
+
+
+class PreviewServer:
+    """Loopback HTTP server that lets a player stream a file while it is being downloaded.
+
+    Seeks are answered only within written ranges: a request beyond them waits up to `wait`
+    seconds for the download to get there, then gets 416. Files of unknown size (HLS/DASH)
+    are served as one growing stream without seeking.
+    """
+    def __init__(self, host="127.0.0.1", wait=30):
+        self.wait = wait
+        self._files = {}        # token -> PartialFile
+        preview = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                preview._serve(self, body=True)
+
+            def do_HEAD(self):
+                preview._serve(self, body=False)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, 0), Handler)
+        self.httpd.daemon_threads = True
+        threading.Thread(target=self.httpd.serve_forever, name="preview", daemon=True).start()
+
+    def url(self, token, partial):
+        """Loopback URL for `partial`; the file name keeps its extension for the player's demuxer probe."""
+        self._files[str(token)] = partial
+        name = os.path.basename(partial.filename or "media")
+        return f"http://{self.httpd.server_address[0]}:{self.httpd.server_address[1]}/{token}/{quote(name)}"
+
+    def forget(self, token):
+        self._files.pop(str(token), None)
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def _serve(self, handler, body):
+        partial = self._files.get(handler.path.lstrip("/").split("/", 1)[0])
+        if partial is None or not partial.wait(0, self.wait): return self._empty(handler, 404)
+        total = partial.total
+        match = re.fullmatch(r"bytes=(\d+)-(\d*)", handler.headers.get("Range") or "")
+        start = int(match.group(1)) if match and total else 0
+        if total and start >= total or not partial.wait(start, self.wait):
+            return self._empty(handler, 416, total)
+        try:
+            if total:
+                end = min(int(match.group(2)), total - 1) if match and match.group(2) else total - 1
+                handler.send_response(206 if match else 200)
+                handler.send_header("Accept-Ranges", "bytes")
+                if match: handler.send_header("Content-Range", f"bytes {start}-{end}/{total}")
+                handler.send_header("Content-Length", str(end - start + 1))
+            else:
+                end = None
+                handler.send_response(200)
+                handler.send_header("Accept-Ranges", "none")
+                handler.send_header("Connection", "close")
+                handler.close_connection = True
+            handler.end_headers()
+            if not body: return
+            pos = start
+            while end is None or pos <= end:
+                n = partial.wait(pos, self.wait)
+                if not n: break     # stalled, or an unsized stream reached its end
+                chunk = partial.read(pos, min(n, CHUNK, end - pos + 1) if end is not None else min(n, CHUNK))
+                if not chunk: break
+                handler.wfile.write(chunk)
+                pos += len(chunk)
+            if end is not None and pos <= end: handler.close_connection = True
+        except OSError:     # player went away, or the file was moved mid-read
+            handler.close_connection = True
+
+    @staticmethod
+    def _empty(handler, status, total=None):
+        handler.send_response(status)
+        if status == 416 and total: handler.send_header("Content-Range", f"bytes */{total}")
+        handler.send_header("Content-Length", "0")
+        handler.end_headers()
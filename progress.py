@@ -0,0 +1,49 @@
+import threading
+from collections import namedtuple
+
+# status: queued | starting | downloading | paused | finished | error | cancelled
+Progress = namedtuple("Progress", "status downloaded total speed eta")
+
+
+class ProgressBoard:
+    """Latest-value progress table between download workers and the UI.
+
+    Workers overwrite their job's slot with plain numbers and never touch Tk. A single UI
+    tick drains the jobs that changed since the previous tick, so the UI cost depends on the
+    tick rate and the number of changed jobs, not on how often yt-dlp calls its hooks.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._latest = {}
+        self._changed = {}
+        self.publishes = 0      # total publish/set_status calls, for measuring UI pressure
+
+    def publish(self, key, status, downloaded=0, total=None, speed=None, eta=None):
+        state = Progress(status, downloaded, total, speed, eta)
+        with self._lock:
+            self.publishes += 1
+            self._latest[key] = state
+            self._changed[key] = state
+
+    def set_status(self, key, status):
+        """Publishes a state change that keeps the last byte counters (paused, error, ...)."""
+        with self._lock:
+            self.publishes += 1
+            prev = self._latest.get(key)
+            state = prev._replace(status=status, speed=None, eta=None) if prev else Progress(status, 0, None, None, None)
+            self._latest[key] = state
+            self._changed[key] = state
+
+    def drain(self):
+        """Returns {key: latest Progress} for every job that published since the last drain."""
+        with self._lock:
+            changed, self._changed = self._changed, {}
+        return changed
+
+    def get(self, key):
+        return self._latest.get(key)
+
+    def forget(self, key):
+        with self._lock:
+            self._latest.pop(key, None)
+            self._changed.pop(key, None)
@@ -0,0 +1,204 @@
+import customtkinter as ctk
+
+from engine import format_eta
+from formats import format_bytes
+
+ROW_HEIGHT = 92          # px per card, padding included
+HISTORY_LIMIT = 5000     # completed entries kept for display; older ones are dropped
+
+MUTED, DONE, FAILED = "#bdc3c7", "#2ecc71", "#e74c3c"
+
+
+class QueueRow:
+    """Display state of one queued or running job.
+
+    Rows are plain data; the view draws whichever of them are scrolled into sight on a small
+    pool of recycled widgets, so thousands of jobs cost a few hundred bytes each.
+    """
+    __slots__ = ('job', 'name', 'fraction', 'text', 'paused', 'started')
+
+    def __init__(self, name, job=None):
+        self.job = job
+        self.name = name
+        self.fraction = 0.0
+        self.text = "Queued"
+        self.paused = False
+        self.started = False
+
+    def paused_text(self):
+        return f"PAUSED | {self.fraction:.1%} cached"
+
+    def apply(self, p):
+        """Folds in the latest Progress snapshot published for this row's job."""
+        if p.status == "downloading":
+            if p.total: self.fraction = min(p.downloaded / p.total, 1.0)
+            self.text = self.paused_text() if self.paused else \
+                f"{self.fraction:.1%} | {format_bytes(p.speed)}/s | ETA: {format_eta(p.eta)}"
+        elif p.status == "starting":
+            self.text, self.started = "Starting...", True
+        elif p.status == "paused":
+            self.text = self.paused_text()
+        elif p.status == "queued":
+            self.text = "Queued"
+        elif p.status == "processing":
+            self.fraction, self.text = 1.0, "Merging / post-processing..."
+
+
+class _RowWidget(ctk.CTkFrame):
+    """One recycled card: shows an active QueueRow, or a (name, text, color) history entry."""
+    def __init__(self, master, view):
+        super().__init__(master, fg_color="#34495e", corner_radius=10, height=ROW_HEIGHT - 10)
+        self.pack_propagate(False)
+        self.row = None
+        self.shown = None        # last rendered state; unchanged cards are not reconfigured
+
+        self.label = ctk.CTkLabel(self, text="", font=("Arial", 11, "bold"), anchor="w")
+        self.label.pack(fill="x", padx=10, pady=(5, 0))
+        self.p_bar = ctk.CTkProgressBar(self, height=8, progress_color=DONE)
+        self.p_bar.set(0)
+        self.p_bar.pack(fill="x", padx=10, pady=3)
+        self.stats = ctk.CTkLabel(self, text="", font=("Arial", 10), text_color=MUTED, height=16)
+        self.stats.pack(fill="x", padx=10)
+
+        self.btn_row = ctk.CTkFrame(self, fg_color="transparent")
+        self.btn_row.pack(fill="x", padx=10, pady=(2, 5))
+        self.pause_btn = ctk.CTkButton(self.btn_row, text="Pause", width=60, height=22,
+                                       command=lambda: self.row and view.on_pause(self.row))
+        self.pause_btn.pack(side="left", padx=2)
+        ctk.CTkButton(self.btn_row, text="Cancel", width=60, height=22, fg_color="#e74c3c", hover_color="#c0392b",
+                      command=lambda: self.row and view.on_cancel(self.row)).pack(side="left", padx=2)
+        self.bump_btn = ctk.CTkButton(self.btn_row, text="Move to Top", width=80, height=22,
+                                      fg_color="#2980b9", hover_color="#1f618d",
+                                      command=lambda: self.row and view.on_bump(self.row))
+        self.bump_btn.pack(side="left", padx=2)
+
+    def show(self, entry):
+        if isinstance(entry, QueueRow):
+            self.row = entry
+            state = (entry.name, entry.fraction, entry.text, MUTED, True, entry.paused, entry.started)
+        else:
+            self.row = None
+            state = (entry[0], 1.0, entry[1], entry[2], False, False, True)
+        if state == self.shown: return
+        name, fraction, text, color, active, paused, started = state
+        old = self.shown or (None,) * 7
+        self.shown = state
+        if name != old[0]: self.label.configure(text=name)
+        if fraction != old[1]: self.p_bar.set(fraction)
+        if (text, color) != old[2:4]: self.stats.configure(text=text, text_color=color)
+        if active != old[4]:
+            if active: self.btn_row.pack(fill="x", padx=10, pady=(2, 5))
+            else: self.btn_row.pack_forget()
+        if paused != old[5]:
+            self.pause_btn.configure(text="Resume" if paused else "Pause",
+                                     fg_color="#2ecc71" if paused else "#f39c12",
+                                     hover_color="#27ae60" if paused else "#d35400")
+        if started != old[6]:
+            if started: self.bump_btn.pack_forget()
+            else: self.bump_btn.pack(side="left", padx=2)
+
+
+class QueueView(ctk.CTkFrame):
+    """Virtualized download list: active rows first, then completed jobs, newest first.
+
+    Only as many card widgets exist as fit in the visible height; scrolling rebinds them to
+    other rows. Finished and failed jobs are collapsed into `history` as (name, text, color)
+    tuples and their rows dropped; cancelled jobs disappear. `on_pause`, `on_cancel` and
+    `on_bump` are called with the QueueRow whose button was pressed.
+    """
+    def __init__(self, master, on_pause, on_cancel, on_bump, **kwargs):
+        super().__init__(master, **kwargs)
+        self.on_pause, self.on_cancel, self.on_bump = on_pause, on_cancel, on_bump
+        self.rows = []           # QueueRow, in submission order
+        self.history = []        # (name, text, color), oldest first
+        self.first = 0           # index of the topmost visible entry
+        self._visible = 1
+        self._pool = []
+        self._dirty = False
+
+        self.grid_columnconfigure(0, weight=1)
+        self.grid_rowconfigure(0, weight=1)
+        self.body = ctk.CTkFrame(self, fg_color="transparent")
+        self.body.grid(row=0, column=0, sticky="nsew")
+        self.body.grid_columnconfigure(0, weight=1)
+        self.scrollbar = ctk.CTkScrollbar(self, command=self._on_scrollbar)
+        self.scrollbar.grid(row=0, column=1, sticky="ns")
+        self.body.bind("<Configure>", self._on_resize)
+        for sequence in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+            self.bind_all(sequence, self._on_wheel, add="+")
+
+    # --- MODEL ---
+    def add(self, name, job=None):
+        row = QueueRow(name, job)
+        self.rows.append(row)
+        self.redraw()
+        return row
+
+    def apply(self, row, p):
+        """Applies a Progress snapshot; returns True once the row has left the active list."""
+        if p.status == "cancelled":
+            self._drop(row)
+        elif p.status in ("finished", "error"):
+            self._drop(row)
+            self.history.append((row.name, "COMPLETE", DONE) if p.status == "finished" else (row.name, "ERROR", FAILED))
+            # Trim in batches so the copy is amortized over many completions
+            if len(self.history) > HISTORY_LIMIT * 1.1: del self.history[:len(self.history) - HISTORY_LIMIT]
+        else:
+            row.apply(p)
+            self._dirty = True
+            return False
+        return True
+
+    def _drop(self, row):
+        try: self.rows.remove(row)
+        except ValueError: pass
+        self._dirty = True
+
+    def __len__(self):
+        return len(self.rows) + len(self.history)
+
+    def _entry(self, index):
+        if index < len(self.rows): return self.rows[index]
+        return self.history[len(self.history) - 1 - (index - len(self.rows))]
+
+    # --- RENDERING ---
+    def refresh(self):
+        """Redraws the visible cards if any row changed since the last refresh."""
+        if self._dirty: self.redraw()
+
+    def redraw(self):
+        self._dirty = False
+        total = len(self)
+        self.first = max(0, min(self.first, total - self._visible))
+        while len(self._pool) < self._visible: self._pool.append(_RowWidget(self.body, self))
+        for i, widget in enumerate(self._pool):
+            index = self.first + i
+            if i < self._visible and index < total:
+                widget.show(self._entry(index))
+                widget.grid(row=i, column=0, sticky="ew", padx=5, pady=5)
+            else:
+                widget.row = None
+                widget.grid_remove()
+        if total: self.scrollbar.set(self.first / total, min(1.0, (self.first + self._visible) / total))
+        else: self.scrollbar.set(0.0, 1.0)
+
+    def _on_resize(self, event):
+        visible = max(1, event.height // ROW_HEIGHT)
+        if visible != self._visible:
+            self._visible = visible
+            self.redraw()
+
+    def scroll_to(self, index):
+        self.first = index
+        self.redraw()
+
+    def _on_scrollbar(self, action, amount, unit=None):
+        if action == "moveto": self.scroll_to(int(float(amount) * len(self)))
+        elif action == "scroll": self.scroll_to(self.first + int(amount) * (self._visible if unit == "pages" else 1))
+
+    def _on_wheel(self, event):
+        widget = self.winfo_containing(event.x_root, event.y_root)
+        # The scrollbar handles wheel events over itself
+        if widget is None or not str(widget).startswith(str(self.body)): return
+        step = -1 if event.num == 4 or getattr(event, 'delta', 0) > 0 else 1
+        self.scroll_to(self.first + step)
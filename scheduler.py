@@ -0,0 +1,151 @@
+import heapq
+import itertools
+import threading
+
+
+class DownloadJob:
+    """A single download request waiting in (or running from) the scheduler queue."""
+    def __init__(self, url, format_id, path, name, priority=0, fragments=12, task=None):
+        self.url = url
+        self.format_id = format_id
+        self.path = path
+        self.name = name
+        self.priority = priority
+        self.fragments = fragments   # requested fragment connections (capped by the scheduler)
+        self.task = task             # UI card or any other observer bound to this job
+        self.partial = None          # preview.PartialFile: what the transfer has written so far
+        self.state = "queued"        # queued | running | paused | done | error | cancelled
+        self.paused = False          # polled by the running transfer, which tears itself down
+        self.cancelled = False
+        self.done = threading.Event()  # set once the job reaches done, error or cancelled
+        self.error = None
+        self.id = None
+        self.seq = None
+        self._entry = None
+
+
+class DownloadScheduler:
+    """Runs jobs on a fixed worker pool with a cap on concurrent jobs and fragment connections.
+
+    Pending jobs wait in a priority queue (FIFO within the same priority). Workers are
+    started lazily and never exceed `max_jobs`, so queueing more jobs never opens more sockets.
+    """
+    def __init__(self, runner, max_jobs=3, max_connections=24):
+        self.runner = runner
+        self.max_jobs = max_jobs
+        self.max_connections = max_connections
+        self.connections = threading.BoundedSemaphore(max_connections)   # held per open transfer connection
+        self.running = 0
+        self._heap = []
+        self._seq = itertools.count()
+        self._pushes = itertools.count()
+        self._cond = threading.Condition()
+        self._workers = []
+
+    def fragments_for(self, job):
+        """Most fragment connections a running job may open. How many it really holds is set
+        by its adaptive limit and by what is free in `connections`, shared by all jobs."""
+        return max(1, min(job.fragments, self.max_connections))
+
+    def submit(self, job):
+        with self._cond:
+            if job.seq is None: job.seq = next(self._seq)
+            self._requeue(job)
+        return job
+
+    def bump(self, job):
+        """Moves a queued job ahead of everything else still waiting."""
+        with self._cond:
+            if job.state != "queued": return False
+            top = max((-e[0] for e in self._heap if e[-1]._entry is e), default=job.priority)
+            job.priority = max(job.priority, top + 1)
+            self._push(job)
+            return True
+
+    def cancel(self, job):
+        """Cancels a job. Returns True if it was dropped right away, False if the running
+        transfer has only been flagged and will stop at its next progress callback."""
+        with self._cond:
+            job.cancelled = True
+            if job.state not in ("queued", "paused"): return False
+            job.state, job._entry = "cancelled", None
+            job.done.set()
+            return True
+
+    def pause(self, job):
+        """Takes a queued job out of the queue, or flags a running one to tear down its transfer."""
+        with self._cond:
+            job.paused = True
+            if job.state == "queued":
+                job.state, job._entry = "paused", None
+
+    def resume(self, job):
+        with self._cond:
+            job.paused = False
+            if job.state == "paused": self._requeue(job)
+
+    def park(self, job):
+        """Called by the runner after it tore a transfer down for a pause request.
+
+        If the user resumed while the transfer was shutting down the job goes straight back
+        into the queue, otherwise it stays paused and holds no worker, thread or socket.
+        """
+        with self._cond:
+            if job.cancelled:
+                job.state = "cancelled"
+                job.done.set()
+            elif job.paused: job.state = "paused"
+            else: self._requeue(job)
+
+    def pending(self):
+        with self._cond:
+            return self._queued()
+
+    # --- INTERNALS ---
+    def _queued(self):
+        return sum(1 for e in self._heap if e[-1]._entry is e)
+
+    def _requeue(self, job):
+        job.state = "queued"
+        self._push(job)
+        idle = len(self._workers) - self.running
+        if len(self._workers) < self.max_jobs and idle < self._queued():
+            self._spawn()
+        self._cond.notify()
+
+    def _push(self, job):
+        entry = [-job.priority, job.seq, next(self._pushes), job]
+        job._entry = entry
+        heapq.heappush(self._heap, entry)
+
+    def _pop(self):
+        while self._heap:
+            entry = heapq.heappop(self._heap)
+            job = entry[-1]
+            if job._entry is entry and job.state == "queued":
+                job._entry = None
+                return job
+        return None
+
+    def _spawn(self):
+        worker = threading.Thread(target=self._work, name=f"download-worker-{len(self._workers)}", daemon=True)
+        self._workers.append(worker)
+        worker.start()
+
+    def _work(self):
+        while True:
+            with self._cond:
+                job = self._pop()
+                while job is None:
+                    self._cond.wait()
+                    job = self._pop()
+                job.state = "running"
+                self.running += 1
+            try:
+                self.runner(job)
+                if job.state == "running": job.state = "done"
+            except Exception:
+                job.state = "error"
+            finally:
+                with self._cond: self.running -= 1
+                if job.state in ("done", "error", "cancelled"): job.done.set()
@@ -0,0 +1,36 @@
+import os
+import tempfile
+import unittest
+
+from archive import DownloadArchive
+
+
+class FindTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+        self.archive = DownloadArchive(os.path.join(self.dir.name, "archive.sqlite3"), streams_dir=self.dir.name)
+
+    def add(self, name, size, info):
+        path = os.path.join(self.dir.name, name)
+        with open(path, 'wb') as f: f.write(b"x" * size)
+        self.archive.add_file(info, "mp4", path)
+        return path
+
+    def test_generic_ids_not_reused(self):
+        # Direct links get their id from the file name, so http://a/video.mp4 and http://b/video.mp4 collide
+        self.add("a.mp4", 2000, {'extractor_key': "Generic", 'id': "video"})
+        self.assertIsNone(self.archive.find({'extractor_key': "Generic", 'id': "video"}, "mp4"))
+
+    def test_expected_size(self):
+        info = {'extractor_key': "Youtube", 'id': "abc"}
+        path = self.add("b.mp4", 2000, info)
+        self.assertEqual(self.archive.find(info, "mp4", expect={'filesize': 2000}), path)
+        self.assertIsNone(self.archive.find(info, "mp4", expect={'filesize': 3000}))
+        self.assertEqual(self.archive.find(info, "mp4", expect={'filesize_approx': 2200}), path)
+        self.assertIsNone(self.archive.find(info, "mp4", expect={'filesize_approx': 3000}))
+        self.assertEqual(self.archive.find(info, "mp4"), path)    # a size mismatch keeps the entry
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,23 @@
+import unittest
+
+from formats import FormatCatalog
+
+
+class FromInfoTest(unittest.TestCase):
+    def test_missing_codec_keys(self):
+        # Direct URLs from the generic extractor: audio_ext='none' and no codec names at all
+        catalog = FormatCatalog({'duration': 10, 'formats': [
+            {'format_id': 'mp4', 'ext': 'mp4', 'video_ext': 'mp4', 'audio_ext': 'none', 'filesize': 1000},
+            {'format_id': 'm4a', 'ext': 'm4a', 'video_ext': 'none', 'tbr': 128},
+            {'format_id': 'webm', 'ext': 'webm'},
+        ]})
+        video, audio, muxed = (catalog.by_id[i] for i in ('mp4', 'm4a', 'webm'))
+        self.assertEqual((video.kind, video.vcodec, video.acodec), ("video", "unknown", None))
+        self.assertEqual((audio.kind, audio.vcodec, audio.acodec), ("audio", None, "unknown"))
+        self.assertEqual(audio.size, 160000)
+        self.assertEqual(muxed.kind, "muxed")
+        self.assertIs(catalog.select("best:kind=audio"), audio)
+
+
+if __name__ == "__main__":
+    unittest.main()
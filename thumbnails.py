@@ -0,0 +1,112 @@
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from http_pool import HttpPool
+from metrics import Metrics
+from paths import cache_dir
+
+THUMB_SIZE = (280, 150)
+
+
+class ThumbnailCache:
+    """Fetches, decodes and scales preview thumbnails on worker threads.
+
+    Only the final THUMB_SIZE image is kept: in memory (LRU) and on disk as a JPEG named by
+    the SHA-1 of the source bytes, so artwork reached through different URLs is stored once.
+    Small `.ref` files map a URL to its digest, which makes repeat previews a single disk read.
+    Downloads go through an HttpPool, so previews from the same image host reuse one connection.
+    Fetch times are recorded in `metrics` as the "thumbnail" phase, labelled by where they came from.
+    """
+    def __init__(self, directory=None, size=THUMB_SIZE, memory_items=32, max_bytes=32 * 2**20, workers=2, http=None,
+                 metrics=None):
+        self.directory = directory or cache_dir("thumbnails")
+        self.size = size
+        self.memory_items = memory_items
+        self.max_bytes = max_bytes
+        self.http = http or HttpPool(per_host=workers)
+        self.metrics = metrics or Metrics()
+        self._memory = OrderedDict()   # url -> PIL image
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(workers, thread_name_prefix="thumbnail")
+
+    def submit(self, url, headers=None):
+        """Returns a Future resolving to the scaled PIL image (or raising on failure)."""
+        return self._pool.submit(self.fetch, url, headers)
+
+    def fetch(self, url, headers=None):
+        with self._lock:
+            img = self._memory.get(url)
+            if img is not None:
+                self._memory.move_to_end(url)
+                self.metrics.record_phase('thumbnail', 0.0, labels={'source': "memory"})
+                return img
+        start = time.perf_counter()
+        img = self._load(url)
+        if img is not None:
+            self.metrics.record_phase('thumbnail', time.perf_counter() - start, labels={'source': "disk"})
+        else:
+            with self.metrics.phase('thumbnail', labels={'source': "network"}, url=url):
+                img = self._download(url, headers)
+        with self._lock:
+            self._memory[url] = img
+            while len(self._memory) > self.memory_items: self._memory.popitem(last=False)
+        return img
+
+    # --- DISK STORE ---
+    def _ref_path(self, url):
+        return os.path.join(self.directory, hashlib.sha1(url.encode()).hexdigest() + ".ref")
+
+    def _image_path(self, digest):
+        return os.path.join(self.directory, digest + ".jpg")
+
+    def _load(self, url):
+        from PIL import Image   # deferred for the CLI and daemon; the GUI has it already (customtkinter imports it)
+        try:
+            with open(self._ref_path(url)) as f: digest = f.read().strip()
+            path = self._image_path(digest)
+            with Image.open(path) as img: img.load()
+            os.utime(path)
+            return img
+        except (OSError, ValueError):
+            return None
+
+    def _download(self, url, headers):
+        from PIL import Image, ImageOps
+        sha = hashlib.sha1()
+        # Stream into a spooled buffer while hashing instead of holding response + copy in memory
+        with tempfile.SpooledTemporaryFile(max_size=512 * 1024) as buf:
+            def write(chunk):
+                sha.update(chunk)
+                buf.write(chunk)
+            self.http.stream(url, write, headers)
+            buf.seek(0)
+            digest = sha.hexdigest()
+            path = self._image_path(digest)
+            if not os.path.exists(path):
+                with Image.open(buf) as src:
+                    # JPEG sources decode straight at 1/2..1/8 scale when the target is small
+                    src.draft("RGB", (self.size[0] * 2, self.size[1] * 2))
+                    img = ImageOps.fit(src.convert("RGB"), self.size, Image.LANCZOS)
+                tmp = f"{path}.{threading.get_ident()}.tmp"
+                img.save(tmp, "JPEG", quality=90)
+                os.replace(tmp, path)
+                self._evict()
+            else:
+                with Image.open(path) as img: img.load()
+        with open(self._ref_path(url), "w") as f: f.write(digest)
+        return img
+
+    def _evict(self):
+        files = [e for e in os.scandir(self.directory) if e.name.endswith(".jpg")]
+        total = sum(e.stat().st_size for e in files)
+        if total <= self.max_bytes: return
+        for entry in sorted(files, key=lambda e: e.stat().st_atime):
+            total -= entry.stat().st_size
+            try: os.remove(entry.path)
+            except OSError: pass
+            if total <= self.max_bytes: break
@@ -0,0 +1,269 @@
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import urllib.request
+
+from paths import data_dir
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS queue (
+    id            INTEGER PRIMARY KEY,
+    url           TEXT NOT NULL,
+    format_id     TEXT NOT NULL,
+    path          TEXT NOT NULL,
+    name          TEXT NOT NULL,
+    profile       TEXT NOT NULL,
+    priority      INTEGER NOT NULL DEFAULT 0,
+    rate          INTEGER,
+    state         TEXT NOT NULL DEFAULT 'queued',
+    worker        TEXT,
+    lease_expires REAL,
+    attempts      INTEGER NOT NULL DEFAULT 0,
+    downloaded    INTEGER NOT NULL DEFAULT 0,
+    total         INTEGER,
+    error         TEXT,
+    created       REAL NOT NULL,
+    updated       REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS queue_claim ON queue (state, profile, priority DESC, id);
+"""
+
+FINISHED_STATES = ("done", "error", "cancelled")
+
+
+def worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class LeaseQueue:
+    """Job queue shared by worker processes through an SQLite database in WAL mode.
+
+    A worker claims jobs for `lease` seconds and renews the lease with each heartbeat, which
+    also carries its progress. A job whose lease runs out (its worker died or hung) goes to the
+    next worker that claims, and to "error" after `max_attempts` claims. Every method is one
+    short transaction, so any number of processes on the host can share the file; workers on
+    other hosts reach it through a daemon (RemoteLeaseQueue).
+    """
+    def __init__(self, path=None, max_attempts=5):
+        self.path = path or os.path.join(data_dir(), "queue.sqlite3")
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+    def _transaction(self, work):
+        # BEGIN IMMEDIATE takes the write lock up front, so two claims never pick the same row
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = work(self._conn, time.time())
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+            return result
+
+    def put(self, url, format_id, path, name, priority=0, rate=None, profile="default"):
+        """Queues a job and returns its id."""
+        now = time.time()
+        with self._lock:
+            cur = self._conn.execute(
+                "INSERT INTO queue (url, format_id, path, name, profile, priority, rate, created, updated)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", (url, format_id, path, name, profile, priority, rate, now, now))
+            return cur.lastrowid
+
+    def claim(self, worker, limit=1, lease=30.0, profile="default"):
+        """Leases up to `limit` queued or expired jobs to `worker`, best priority first."""
+        def work(conn, now):
+            conn.execute("UPDATE queue SET state = 'error', error = ?, worker = NULL, updated = ?"
+                         " WHERE state = 'leased' AND lease_expires < ? AND attempts >= ?",
+                         (f"abandoned by {self.max_attempts} workers", now, now, self.max_attempts))
+            cur = conn.execute("SELECT * FROM queue WHERE profile = ? AND (state = 'queued' OR state = 'leased'"
+                               " AND lease_expires < ?) ORDER BY priority DESC, id LIMIT ?", (profile, now, limit))
+            cols = [c[0] for c in cur.description]
+            rows = [dict(zip(cols, row)) for row in cur.fetchall()]
+            for row in rows:
+                conn.execute("UPDATE queue SET state = 'leased', worker = ?, lease_expires = ?, attempts = attempts + 1,"
+                             " updated = ? WHERE id = ?", (worker, now + lease, now, row['id']))
+            return rows
+        return self._transaction(work)
+
+    def heartbeat(self, worker, progress, lease=30.0):
+        """Renews `worker`'s leases on the jobs in `progress` ({id: (downloaded, total)}).
+
+        Returns the ids the worker still holds; it should stop the others (cancelled, or
+        reclaimed by another worker after the lease ran out).
+        """
+        def work(conn, now):
+            held = []
+            for job_id, (downloaded, total) in progress.items():
+                cur = conn.execute("UPDATE queue SET lease_expires = ?, downloaded = ?, total = ?, updated = ?"
+                                   " WHERE id = ? AND worker = ? AND state = 'leased'",
+                                   (now + lease, downloaded or 0, total, now, job_id, worker))
+                if cur.rowcount: held.append(job_id)
+            return held
+        return self._transaction(work) if progress else []
+
+    def finish(self, job_id, worker, state, error=None):
+        """Records the outcome of a job `worker` still holds; returns False if it lost the lease."""
+        def work(conn, now):
+            cur = conn.execute("UPDATE queue SET state = ?, error = ?, worker = NULL, lease_expires = NULL, updated = ?,"
+                               " downloaded = CASE WHEN ? = 'done' THEN COALESCE(total, downloaded) ELSE downloaded END"
+                               " WHERE id = ? AND worker = ? AND state = 'leased'", (state, error, now, state, job_id, worker))
+            return cur.rowcount > 0
+        return self._transaction(work)
+
+    def release(self, worker, ids):
+        """Hands jobs back to the queue (the worker is shutting down) without counting an attempt."""
+        def work(conn, now):
+            for job_id in ids:
+                conn.execute("UPDATE queue SET state = 'queued', worker = NULL, lease_expires = NULL,"
+                             " attempts = MAX(attempts - 1, 0), updated = ? WHERE id = ? AND worker = ? AND state = 'leased'",
+                             (now, job_id, worker))
+        self._transaction(work)
+
+    def cancel(self, job_id):
+        """Cancels a job; a worker running it stops at its next heartbeat."""
+        def work(conn, now):
+            cur = conn.execute(f"UPDATE queue SET state = 'cancelled', lease_expires = NULL, updated = ?"
+                               f" WHERE id = ? AND state NOT IN ({', '.join('?' * len(FINISHED_STATES))})",
+                               (now, job_id, *FINISHED_STATES))
+            return cur.rowcount > 0
+        return self._transaction(work)
+
+    def jobs(self):
+        with self._lock:
+            cur = self._conn.execute("SELECT * FROM queue ORDER BY id")
+            cols = [c[0] for c in cur.description]
+            return [dict(zip(cols, row)) for row in cur.fetchall()]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class RemoteLeaseQueue:
+    """LeaseQueue hosted by a daemon started with --queue, for workers on other hosts.
+
+    `token` is the daemon's shared secret, if it was started with one.
+    """
+    def __init__(self, base, token=None):
+        self.base = base.rstrip("/")
+        self.headers = {"Content-Type": "application/json"}
+        if token: self.headers["Authorization"] = f"Bearer {token}"
+
+    def _call(self, path, payload=None):
+        data = json.dumps(payload).encode() if payload is not None else None
+        req = urllib.request.Request(self.base + path, data=data, headers=self.headers)
+        with urllib.request.urlopen(req, timeout=30) as resp:
+            return json.load(resp)
+
+    def put(self, url, format_id, path, name, priority=0, rate=None, profile="default"):
+        return self._call("/queue", {'url': url, 'format_id': format_id, 'path': path, 'name': name,
+                                     'priority': priority, 'rate': rate, 'profile': profile})['id']
+
+    def claim(self, worker, limit=1, lease=30.0, profile="default"):
+        return self._call("/queue/claim", {'worker': worker, 'limit': limit, 'lease': lease, 'profile': profile})
+
+    def heartbeat(self, worker, progress, lease=30.0):
+        if not progress: return []
+        return self._call("/queue/heartbeat", {'worker': worker, 'lease': lease, 'progress': progress})['held']
+
+    def finish(self, job_id, worker, state, error=None):
+        return self._call(f"/queue/{job_id}/finish", {'worker': worker, 'state': state, 'error': error})['ok']
+
+    def release(self, worker, ids):
+        self._call("/queue/release", {'worker': worker, 'ids': list(ids)})
+
+    def cancel(self, job_id):
+        return self._call(f"/queue/{job_id}/cancel", {})['ok']
+
+    def jobs(self):
+        return self._call("/queue")
+
+    def close(self):
+        pass
+
+
+def open_queue(spec=None, token=None):
+    """A daemon URL gives a RemoteLeaseQueue, anything else the path of a LeaseQueue database."""
+    if spec and spec.startswith(("http://", "https://")): return RemoteLeaseQueue(spec, token)
+    return LeaseQueue(spec)
+
+
+class QueueWorker:
+    """Runs jobs claimed from a LeaseQueue on a DownloadEngine, up to the engine's max_jobs at once.
+
+    Every `lease / 3` seconds one heartbeat renews the leases of all running jobs and reports
+    their progress; a job the worker no longer holds is cancelled locally. Outcomes are
+    written back as jobs finish. On `stop()` running jobs are paused and released, so another
+    worker resumes them from their partial files (when it shares the output directory).
+    """
+    def __init__(self, queue, engine, name=None, lease=30.0, poll=0.5):
+        self.queue = queue
+        self.engine = engine
+        self.name = name or worker_name()
+        self.lease = lease
+        self.poll = poll
+        self.active = {}                # queue id -> DownloadJob
+        self._stop = threading.Event()
+
+    def run(self):
+        """Claims and runs jobs until stop() is called."""
+        beat = time.monotonic()
+        try:
+            while not self._stop.is_set():
+                try:
+                    self._reap()
+                    free = self.engine.scheduler.max_jobs - len(self.active)
+                    if free > 0:
+                        for row in self.queue.claim(self.name, free, self.lease, self.engine.profile): self._start(row)
+                    if time.monotonic() - beat >= self.lease / 3:
+                        beat = time.monotonic()
+                        self._heartbeat()
+                except Exception as e:
+                    # A busy database or an unreachable daemon: try again on the next round
+                    self.engine.metrics.error('queue', e)
+                self._stop.wait(self.poll)
+        finally:
+            self._shutdown()
+
+    def stop(self):
+        self._stop.set()
+
+    def _start(self, row):
+        job = self.engine.submit(row['url'], row['format_id'], row['path'], row['name'], row['priority'],
+                                 rate=row['rate'])
+        self.active[row['id']] = job
+        self.engine.metrics.inc('queue_claims_total', reclaimed=str(row['state'] == "leased").lower())
+
+    def _reap(self):
+        for job_id, job in list(self.active.items()):
+            if job.done.is_set():
+                del self.active[job_id]
+                self.queue.finish(job_id, self.name, job.state, job.error)
+
+    def _heartbeat(self):
+        progress = {}
+        for job_id, job in self.active.items():
+            p = self.engine.progress.get(job)
+            progress[job_id] = (p.downloaded, p.total) if p else (0, None)
+        held = set(self.queue.heartbeat(self.name, progress, self.lease))
+        for job_id in set(progress) - held:
+            # Cancelled in the queue, or our lease ran out and the job went to another worker
+            self.engine.cancel(self.active.pop(job_id))
+
+    def _shutdown(self, timeout=10.0):
+        for job in self.active.values(): self.engine.pause(job)
+        deadline = time.monotonic() + timeout
+        for job in self.active.values():
+            while job.state not in ("paused", "done", "error", "cancelled") and time.monotonic() < deadline:
+                time.sleep(0.05)
+        self._reap()
+        if self.active: self.queue.release(self.name, list(self.active))
+        self.active.clear()
@@ -0,0 +1,118 @@
+import threading
+from contextlib import contextmanager
+
+# Parameters YoutubeDL reads while it works rather than once in __init__; only these may
+# differ from the profile between uses of a pooled instance
+OVERRIDABLE = frozenset({
+    'noplaylist', 'extract_flat', 'lazy_playlist', 'playlist_items', 'format', 'outtmpl', 'progress_hooks',
+    'http_headers', 'concurrent_fragment_downloads', 'continuedl', 'skip_download', 'simulate',
+})
+_MISSING = object()
+
+
+class YdlPool:
+    """Long-lived YoutubeDL instances, kept warm per option profile and instance factory.
+
+    A fresh YoutubeDL loads the extractor list, instantiates each extractor it touches and
+    starts with empty in-memory caches (YouTube's player JS and signature functions among
+    them); a pooled one keeps all of that between uses. `options(profile)` gives the base
+    parameters an instance is built with. `acquire()` applies the entries of a call's
+    parameters that differ from that base (OVERRIDABLE ones only, anything else raises
+    ValueError) and `release()` puts the base back. An instance is used by one caller at a
+    time; an instance released after a failure is closed instead of reused.
+    """
+    def __init__(self, options, size=2, metrics=None):
+        self.options = options
+        self.size = size            # idle instances kept per (profile, factory)
+        self.metrics = metrics
+        self._lock = threading.Lock()
+        self._idle = {}             # (profile, factory) -> [YoutubeDL, ...]
+        self._leased = {}           # id(ydl) -> (key, ydl, saved params)
+
+    def _create(self, profile, factory):
+        import yt_dlp
+        return (factory or yt_dlp.YoutubeDL)(dict(self.options(profile)))
+
+    def warm(self, profile, factory=None):
+        """Builds an idle instance ahead of the first call."""
+        key = (profile, factory)
+        with self._lock:
+            if self._idle.get(key): return
+        ydl = self._create(profile, factory)
+        with self._lock: self._idle.setdefault(key, []).append(ydl)
+
+    def acquire(self, profile, params=None, factory=None):
+        """An instance for `profile` (made by `factory`, yt_dlp.YoutubeDL by default) set up with `params`."""
+        key = (profile, factory)
+        with self._lock:
+            idle = self._idle.get(key)
+            ydl = idle.pop() if idle else None
+        if self.metrics is not None: self.metrics.inc('ydl_pool_total', result="miss" if ydl is None else "hit")
+        if ydl is None: ydl = self._create(profile, factory)
+        base = self.options(profile)
+        changes = {k: v for k, v in (params or {}).items() if base.get(k, _MISSING) != v}
+        try:
+            saved = self._apply(ydl, changes)
+        except Exception:
+            ydl.close()
+            raise
+        with self._lock: self._leased[id(ydl)] = (key, ydl, saved)
+        return ydl
+
+    def release(self, ydl, discard=False):
+        """Returns `ydl` to the pool, or closes it when `discard` is set or the pool is full."""
+        with self._lock: key, _, saved = self._leased.pop(id(ydl))
+        if not discard:
+            try:
+                self._apply(ydl, saved)
+            except Exception:
+                discard = True
+        # Per-run counters a fresh instance would start from
+        ydl._download_retcode = ydl._num_downloads = ydl._num_videos = ydl._playlist_level = 0
+        ydl._playlist_urls.clear()
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if not discard and len(idle) < self.size:
+                idle.append(ydl)
+                return
+        ydl.close()
+
+    @contextmanager
+    def lease(self, profile, params=None, factory=None):
+        ydl = self.acquire(profile, params, factory)
+        try:
+            yield ydl
+        except BaseException:
+            self.release(ydl, discard=True)
+            raise
+        self.release(ydl)
+
+    def close(self):
+        with self._lock:
+            idle = [ydl for ydls in self._idle.values() for ydl in ydls]
+            self._idle.clear()
+        for ydl in idle: ydl.close()
+
+    @staticmethod
+    def _apply(ydl, changes):
+        """Sets `changes` on the instance and returns what restores the previous values."""
+        from yt_dlp.utils.networking import HTTPHeaderDict, std_headers
+        bad = set(changes) - OVERRIDABLE
+        if bad: raise ValueError(f"option(s) fixed when a YoutubeDL is created: {', '.join(sorted(bad))}")
+        saved = {}
+        for key, value in changes.items():
+            if key == 'progress_hooks':
+                saved[key] = list(ydl._progress_hooks)
+                ydl._progress_hooks[:] = value
+                continue
+            old = ydl.params.get(key, _MISSING)
+            saved[key] = HTTPHeaderDict(old) if key == 'http_headers' and old is not _MISSING else old
+            if value is _MISSING: ydl.params.pop(key, None)
+            elif key == 'http_headers': ydl.params[key] = HTTPHeaderDict(std_headers, value)
+            else: ydl.params[key] = value
+        # The same normalisation and parsing YoutubeDL.__init__ does for these
+        if 'outtmpl' in changes: ydl._parse_outtmpl()
+        if 'format' in changes:
+            spec = ydl.params.get('format')
+            ydl.format_selector = spec if spec in (None, '-') or callable(spec) else ydl.build_format_selector(spec)
+        return saved